@@ -18,7 +18,9 @@ from dotenv import load_dotenv
 from api.auth import setup_jwt, login_required, admin_required, get_current_user, agent_required, admin_or_agent_required
 from typing import Optional, Dict
 from src.utils.logging_config import LoggingConfig, RequestContext
+from src.utils.json_provider import setup_json_provider
 from src.balance_system.models.user import ROLE_USER, ROLE_ADMIN, ROLE_AGENT, ROLE_SENIOR_AGENT
+from src.balance_system.models.base import generate_uuid7
 
 # 添加项目根目录到 Python 路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -43,6 +45,9 @@ CORS(app, resources={r"/api/*": {"origins": [
     "https://tarote.tech"  # 域名
 ]}})
 
+# 使用orjson序列化JSON响应
+setup_json_provider(app)
+
 # 配置 JWT
 jwt = JWTManager(app)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key')
@@ -517,8 +522,8 @@ def upload_file():
     # 记录开始时间（用于性能分析）
     start_time = time.time()
 
-    # 生成唯一任务ID
-    task_id = str(uuid.uuid4())
+    # 生成唯一任务ID（按时间递增，写入api_usages.task_id唯一索引时保持顺序插入）
+    task_id = generate_uuid7()
     
     # 创建任务目录
     task_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "tasks", task_id)
@@ -722,7 +727,7 @@ def analyze_audio():
             
             # 将音频文件添加到处理器的保护列表
             if hasattr(audio_processor, 'important_files'):
-                audio_processor.important_files.append(audio_path)
+                audio_processor.important_files.add(audio_path)
                 logger.info(f"音频文件已添加到处理器的保护列表: {audio_path}")
                 
         else:
@@ -759,15 +764,16 @@ def analyze_audio():
             model_size = task.get("model_size", "base")
             original_file = task.get("original_file", "")
             
-            # 记录API使用并扣除余额
-            ApiUsageService.record_api_usage(
+            # 扣除余额，API使用记录由后台线程批量写入
+            ApiUsageService.enqueue_api_usage(
                 user_id=user_id,
                 api_type="analyze_audio",
                 task_id=task_id,
                 cost=estimated_cost,
                 input_size=file_size_mb,
                 duration=audio_duration_minutes * 60,  # 转换为秒
-                details=f"analyze file {original_file}"
+                # 任务ID已单独保存，详情只记录文件名，不重复保存服务器上的完整路径
+                details=f"analyze file {task.get('filename') or os.path.basename(original_file)}"
             )
             
             logger.info(f"成功扣除用户 {user_id} 余额: {estimated_cost} 点")
@@ -906,7 +912,7 @@ def split_audio():
         
         # 将音频文件添加到处理器的保护列表中
         if hasattr(audio_processor, 'important_files'):
-            audio_processor.important_files.append(audio_path)
+            audio_processor.important_files.add(audio_path)
             logger.info(f"将音频文件添加到处理器的保护列表: {audio_path}")
         
         # 执行分割
@@ -1400,64 +1406,52 @@ def agent_charge():
         from src.balance_system.models.user import User
         from src.balance_system.services.balance_service import BalanceService
         
-        # 检查代理余额是否足够
+        # 查找目标用户
         with get_db_session() as session:
-            agent_user = session.query(User).filter_by(id=agent_id).first()
-            
-            if not agent_user:
-                return jsonify({
-                    'status': 'error',
-                    'message': '代理账户不存在'
-                }), 404
-            
-            if float(agent_user.balance) < amount:
+            target_user = session.query(User.id, User.username, User.role).filter_by(email=email).first()
+        
+        if not target_user:
+            return jsonify({
+                'status': 'error',
+                'message': f'未找到邮箱为 {email} 的用户'
+            }), 404
+        
+        # 检查目标用户不是代理或管理员
+        if target_user.role > 0:  # 非普通用户
+            return jsonify({
+                'status': 'error',
+                'message': f'不能给其他代理或管理员充值'
+            }), 400
+        
+        # 执行划扣操作：从代理账户扣除，加到用户账户，并记录交易历史
+        # 代理余额检查与扣除在同一条UPDATE中完成，余额不足时不做任何修改
+        try:
+            agent_transaction, user_transaction = BalanceService.record_agent_charge(agent_id, target_user.id, amount)
+        except ValueError as e:
+            if str(e) == "代理余额不足":
+                balance_info = BalanceService.get_user_balance(agent_id)
                 return jsonify({
                     'status': 'error',
-                    'message': f'代理余额不足，当前余额: {float(agent_user.balance)} 点'
+                    'message': f'代理余额不足，当前余额: {balance_info["balance"]} 点'
                 }), 400
-            
-            # 查找目标用户
-            target_user = session.query(User).filter_by(email=email).first()
-            
-            if not target_user:
+            if str(e) == "代理用户不存在":
                 return jsonify({
                     'status': 'error',
-                    'message': f'未找到邮箱为 {email} 的用户'
+                    'message': '代理账户不存在'
                 }), 404
-            
-            # 检查目标用户不是代理或管理员
-            if target_user.role > 0:  # 非普通用户
-                return jsonify({
-                    'status': 'error',
-                    'message': f'不能给其他代理或管理员充值'
-                }), 400
-            
-            # 执行划扣操作：从代理账户扣除，加到用户账户
-            # 1. 从代理账户扣除
-            agent_user.balance = float(agent_user.balance) - amount
-            agent_user.total_consumed = float(agent_user.total_consumed) + amount
-            
-            # 2. 给用户账户充值
-            target_user.balance = float(target_user.balance) + amount
-            target_user.total_charged = float(target_user.total_charged) + amount
-            
-            # 保存更改
-            session.commit()
-            
-            # 记录交易历史
-            BalanceService.record_agent_charge(agent_id, target_user.id, amount)
-            
-            logger.info(f"代理 {agent['username']} 为用户 {target_user.username} 充值 {amount} 点")
-            
-            return jsonify({
-                'status': 'success',
-                'message': f'成功为用户 {target_user.username} 充值 {amount} 点',
-                'data': {
-                    'agent_balance': float(agent_user.balance),
-                    'user_balance': float(target_user.balance),
-                    'amount': amount
-                }
-            })
+            raise
+        
+        logger.info(f"代理 {agent['username']} 为用户 {target_user.username} 充值 {amount} 点")
+        
+        return jsonify({
+            'status': 'success',
+            'message': f'成功为用户 {target_user.username} 充值 {amount} 点',
+            'data': {
+                'agent_balance': agent_transaction['balance'],
+                'user_balance': user_transaction['balance'],
+                'amount': amount
+            }
+        })
     except Exception as e:
         logger.exception(f"代理充值时出错: {str(e)}")
         return jsonify({
@@ -9,8 +9,6 @@ from src.balance_system.services.user_service import UserService
 import os
 import uuid
 import subprocess
-from src.balance_system.models.user import User
-from src.balance_system.db import db_session
 from src.utils.logging_config import LoggingConfig
 from datetime import datetime
 
@@ -123,6 +121,7 @@ def get_transactions():
         user_id = user['id']
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
+        after_id = request.args.get('after_id', type=int)
         
         balance_service = BalanceService()
         
@@ -130,7 +129,8 @@ def get_transactions():
         transactions, total = balance_service.get_user_transactions(
             user_id, 
             page=page, 
-            per_page=per_page
+            per_page=per_page,
+            after_id=after_id
         )
         
         return jsonify({
@@ -141,7 +141,8 @@ def get_transactions():
                     'page': page,
                     'per_page': per_page,
                     'total': total,
-                    'pages': (total + per_page - 1) // per_page
+                    'pages': (total + per_page - 1) // per_page,
+                    'next_cursor': transactions[-1]['id'] if len(transactions) == per_page else None
                 }
             }
         })
@@ -273,15 +274,14 @@ def admin_charge():
         
         # 根据邮箱查找用户
         user_service = UserService()
-        user = user_service.get_user_by_email(email)
+        user_id = user_service.get_user_id_by_email(email)
         
-        if not user:
+        if not user_id:
             return jsonify({
                 'status': 'error',
                 'message': f'未找到邮箱为 {email} 的用户'
             }), 404
         
-        user_id = user.id
         balance_service = BalanceService()
         
         # 执行充值
@@ -385,22 +385,21 @@ def check_balance():
         if not file_size_mb:
             return jsonify({"error": "缺少文件大小信息"}), 400
             
-        # 获取用户信息
-        db_user = db_session.query(User).filter(User.id == user_id).first()
-        if not db_user:
+        # 检查余额（余额与预估费用一并返回，无需再单独查询用户）
+        try:
+            balance_check = BalanceService.check_balance(
+                user_id=user_id,
+                file_size_mb=file_size_mb,
+                audio_duration_minutes=audio_duration_minutes
+            )
+        except ValueError:
+            # get_user_balance在用户不存在时抛出ValueError
             return jsonify({"error": "未找到用户信息"}), 404
-            
-        # 检查余额
-        balance_check = BalanceService.check_balance(
-            user_id=user_id,
-            file_size_mb=file_size_mb,
-            audio_duration_minutes=audio_duration_minutes
-        )
         
         return jsonify({
             "status": "success",
             "data": {
-                "balance": float(db_user.balance),
+                "balance": balance_check["balance"],
                 "required_balance": float(balance_check["required_balance"]),
                 "is_sufficient": balance_check["is_sufficient"],
                 "file_size_mb": file_size_mb,
@@ -2,6 +2,7 @@ import os
 import json
 import logging
 from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
 from src.balance_system.services.pricing_service import PricingService
 from api.auth import login_required, admin_required
 from src.utils.logging_config import LoggingConfig
@@ -32,11 +33,13 @@ def estimate_cost():
             
         # 如果提供了task_id，从task中获取信息
         if task_id:
-            from app import tasks
-            if task_id not in tasks:
+            # 在函数内部导入task_manager以避免循环导入
+            from api.app import task_manager
+            
+            task = task_manager.get_task(task_id)
+            if not task:
                 return jsonify({"error": "任务不存在"}), 404
                 
-            task = tasks[task_id]
             file_size_mb = task.get('size_mb')
             audio_duration_minutes = task.get('audio_duration_minutes')
             
@@ -87,26 +87,30 @@ def get_api_usage_history():
         user_id = user['id']
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
+        after_id = request.args.get('after_id', type=int)
         
         # 创建服务实例
         api_usage_service = ApiUsageService()
         
         # 获取使用历史
-        usage_records, total = api_usage_service.get_user_api_usage(
+        result = api_usage_service.get_user_api_usage(
             user_id=user_id,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            after_id=after_id
         )
+        total = result['total']
         
         return jsonify({
             'status': 'success',
             'data': {
-                'records': usage_records,
+                'records': result['items'],
                 'pagination': {
                     'page': page,
                     'per_page': per_page,
                     'total': total,
-                    'pages': (total + per_page - 1) // per_page
+                    'pages': (total + per_page - 1) // per_page,
+                    'next_cursor': result['next_cursor']
                 }
             }
         })
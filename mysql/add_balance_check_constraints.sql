@@ -0,0 +1,5 @@
+-- 为已有数据库添加用户余额非负约束（新建数据库由 Base.metadata.create_all 自动创建）
+-- 需要 MySQL 8.0.16 及以上版本才会强制执行 CHECK 约束；添加前需确保已有数据满足约束
+USE audio_app;
+
+ALTER TABLE users ADD CONSTRAINT ck_users_balance_nonnegative CHECK (balance >= 0);
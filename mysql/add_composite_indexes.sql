@@ -0,0 +1,15 @@
+-- 为已有数据库添加复合索引（新建数据库由 Base.metadata.create_all 自动创建）
+-- 使用在线DDL，建索引期间不锁表
+USE audio_app;
+
+-- 按用户查询使用记录并按时间排序
+ALTER TABLE api_usages ADD INDEX ix_api_usages_user_created (user_id, created_at), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- 按API类型、模型大小查询有效的定价规则
+ALTER TABLE pricing_rules ADD INDEX ix_pricing_api_model_active (api_type, model_size, is_active), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- 查询有效套餐并按排序字段排序
+ALTER TABLE charge_packages ADD INDEX ix_charge_pkg_active_sort (is_active, sort_order), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- 按用户查询交易记录并按时间倒序分页
+ALTER TABLE transaction_records ADD INDEX ix_transaction_records_user_created (user_id, created_at), ALGORITHM=INPLACE, LOCK=NONE;
@@ -2,11 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
+import sys
 import subprocess
 import logging
 import shutil
+import functools
 from pathlib import Path
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Union, Tuple, Callable
+from collections import deque
 
 # 添加 PyAV 导入和可用性检查
 try:
@@ -16,6 +20,14 @@ except ImportError:
     PYAV_AVAILABLE = False
 from ..temp import TempFileManager
 
+# FFmpeg stderr 进度解析
+_DURATION_RE = re.compile(rb'Duration: (\d+):(\d+):(\d+\.\d+)')
+_TIME_RE = re.compile(rb'time=(\d+):(\d+):(\d+\.\d+)')
+
+def _hms_to_seconds(hours: bytes, minutes: bytes, seconds: bytes) -> float:
+    """将FFmpeg输出的时:分:秒转换为秒数"""
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
 class AudioConverter:
     """音频转换器类"""
     
@@ -59,8 +71,16 @@ class AudioConverter:
         return ext.lower() in self.VIDEO_EXTENSIONS
     
     def extract_audio(self, file_path: str, output_format: str = "wav", 
-                     temp_manager: Optional[TempFileManager] = None) -> str:
-        """从音频或视频文件中提取音频"""
+                     temp_manager: Optional[TempFileManager] = None,
+                     progress_callback: Optional[Callable[[int], None]] = None) -> str:
+        """从音频或视频文件中提取音频
+        
+        Args:
+            file_path: 输入文件路径
+            output_format: 输出格式
+            temp_manager: 临时文件管理器
+            progress_callback: 进度回调函数 (percent) -> None，仅FFmpeg命令行方式会上报
+        """
         if not os.path.exists(file_path):
             self.logger.error(f"文件不存在: {file_path}")
             return ""
@@ -72,8 +92,11 @@ class AudioConverter:
             # 如果已经是音频文件且格式匹配，考虑直接返回
             if self.is_audio_file(file_path) and file_path.lower().endswith(f".{output_format}"):
                 self.logger.info(f"文件已经是{output_format}格式，无需转换")
-                output_path = manager.create_named_file(Path(file_path).stem, f".{output_format}")
-                shutil.copy2(file_path, output_path)
+                # 优先使用硬链接，由临时文件管理器登记为只读链接；无法链接时复制一份
+                output_path = manager.create_named_link(file_path, Path(file_path).stem, f".{output_format}")
+                if output_path is None:
+                    output_path = manager.create_named_file(Path(file_path).stem, f".{output_format}")
+                    self._reflink_or_copy(file_path, output_path)
                 return output_path
                 
             # 创建输出文件路径
@@ -95,7 +118,7 @@ class AudioConverter:
                     self.logger.warning("PyAV 提取失败，回退到 FFmpeg 命令行方式")
             
             # 如果 PyAV 不可用或提取失败，回退到 FFmpeg 命令行
-            success = self._extract_with_ffmpeg(file_path, output_path, output_format)
+            success = self._extract_with_ffmpeg(file_path, output_path, output_format, progress_callback)
             if success:
                 self.logger.info(f"使用 FFmpeg 成功提取音频: {output_path}")
                 return output_path
@@ -107,6 +130,25 @@ class AudioConverter:
             self.logger.exception(f"提取音频时出错: {str(e)}")
             return ""
     
+    def _reflink_or_copy(self, src_path: str, dst_path: str) -> None:
+        """
+        将源文件复制到目标路径：优先reflink，不支持时完整复制
+        
+        目标文件拥有独立的数据，后续写入不会影响源文件。
+        """
+        # 1. reflink（支持写时复制的文件系统上只复制元数据，不支持时cp会自动回退为普通复制）
+        if sys.platform.startswith('linux'):
+            try:
+                result = subprocess.run(['cp', '--reflink=auto', src_path, dst_path], capture_output=True)
+                if result.returncode == 0:
+                    self.logger.debug(f"使用cp --reflink=auto: {src_path} -> {dst_path}")
+                    return
+            except OSError as e:
+                self.logger.debug(f"cp --reflink=auto 执行失败: {str(e)}")
+        
+        # 2. 完整复制
+        shutil.copy2(src_path, dst_path)
+    
     def _extract_with_pyav(self, file_path: str, output_path: str, output_format: str) -> bool:
         """使用 PyAV 提取音频"""
         try:
@@ -191,39 +233,76 @@ class AudioConverter:
         }
         return format_codec_map.get(output_format.lower(), 'copy')
     
-    def _extract_with_ffmpeg(self, file_path: str, output_path: str, output_format: str) -> bool:
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _codec_args(output_format: str) -> Tuple[str, ...]:
+        """根据输出格式获取FFmpeg编码器参数（按格式缓存，避免每次调用重复构建）"""
+        output_format = output_format.lower()
+        if output_format == 'wav':
+            return ('-acodec', 'pcm_s16le')
+        elif output_format == 'mp3':
+            return ('-acodec', 'libmp3lame', '-q:a', '2')
+        elif output_format == 'ogg':
+            return ('-acodec', 'libvorbis', '-q:a', '4')
+        return ('-acodec', 'copy')  # 默认复制音频流
+    
+    def _extract_with_ffmpeg(self, file_path: str, output_path: str, output_format: str,
+                             progress_callback: Optional[Callable[[int], None]] = None) -> bool:
         """使用 FFmpeg 命令行提取音频（备选方法）"""
         try:
-            # 选择适当的编码器和参数
-            codec_params = []
-            if output_format.lower() == 'wav':
-                codec_params = ['-acodec', 'pcm_s16le']
-            elif output_format.lower() == 'mp3':
-                codec_params = ['-acodec', 'libmp3lame', '-q:a', '2']
-            elif output_format.lower() == 'ogg':
-                codec_params = ['-acodec', 'libvorbis', '-q:a', '4']
-            else:
-                codec_params = ['-acodec', 'copy']  # 默认复制音频流
-                
-            # 构建FFmpeg命令
-            cmd = [
+            # 构建FFmpeg命令，编码器参数取自缓存的不可变元组
+            cmd = (
                 'ffmpeg',
                 '-i', file_path,       # 输入文件
                 '-vn',                 # 禁用视频
-                *codec_params,         # 音频编码器参数
+            ) + self._codec_args(output_format) + (
                 '-ar', '44100',        # 采样率
                 '-ac', '2',            # 声道数
                 '-y',                  # 覆盖已存在的文件
                 output_path            # 输出文件
-            ]
+            )
             
             # 执行命令
             self.logger.debug(f"执行命令: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # with语句结束时关闭stderr管道并等待进程退出
+            with subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as process:
+                try:
+                    # 按块读取stderr，解析总时长和当前进度，只在百分比变化时回调
+                    duration = 0.0
+                    last_percent = -1
+                    carry = b""
+                    stderr_tail = deque(maxlen=16)  # 只保留末尾部分用于错误日志
+                    while True:
+                        chunk = process.stderr.read1(4096)
+                        if not chunk:
+                            break
+                        stderr_tail.append(chunk)
+                        data = carry + chunk
+                        carry = data[-64:]  # 保留尾部，避免匹配被块边界截断
+                    
+                        if not duration:
+                            match = _DURATION_RE.search(data)
+                            if match:
+                                duration = _hms_to_seconds(*match.groups())
+                    
+                        if progress_callback and duration > 0:
+                            times = _TIME_RE.findall(data)
+                            if times:
+                                percent = min(100, int(_hms_to_seconds(*times[-1]) / duration * 100))
+                                if percent != last_percent:
+                                    last_percent = percent
+                                    progress_callback(percent)
+                    
+                    returncode = process.wait()
+                except BaseException:
+                    # 读取、解析或进度回调出错时终止FFmpeg，避免其继续在后台写入输出文件
+                    process.kill()
+                    raise
             
             # 检查结果
-            if result.returncode != 0:
-                self.logger.error(f"FFmpeg 提取音频失败: {result.stderr}")
+            if returncode != 0:
+                stderr = b"".join(stderr_tail).decode('utf-8', errors='replace')
+                self.logger.error(f"FFmpeg 提取音频失败: {stderr}")
                 return False
             
             if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
@@ -2,9 +2,9 @@ import os
 import tempfile
 import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 from dataclasses import dataclass
-from typing import List, Callable, Dict, Any, Optional, Union
+from typing import List, Callable, Dict, Any, Optional, Union, Tuple
 
 from .audio_utils import AudioUtils
 from ..temp import TempFileManager
@@ -16,6 +16,9 @@ try:
 except ImportError:
     PYAV_AVAILABLE = False
 
+# CPU核心数在进程生命周期内不变，只获取一次（获取失败时默认为4）
+_CPU_COUNT = os.cpu_count() or 4
+
 @dataclass
 class SegmentOptions:
     """音频片段选项"""
@@ -88,14 +91,49 @@ class AudioSplitter:
         
         # 设置最大线程数，默认为CPU核心数-1（至少为2）
         if max_workers is None:
-            import os
-            cpu_count = os.cpu_count() or 4  # 如果获取失败，默认为4
-            self.max_workers = max(2, cpu_count - 1)  # 至少为2
+            self.max_workers = max(2, _CPU_COUNT - 1)  # 至少为2
         else:
             self.max_workers = max(2, max_workers)  # 确保至少为2
             
+        # 已解码的源音频 {文件路径: Future[AudioSegment]}，同一分割任务内的所有片段共享，
+        # 避免pydub回退路径为每个片段重新启动ffmpeg解码整个文件
+        self._source_audio: Dict[str, Future] = {}
+        # 正在使用各源文件的分割任务数，分割器可能被多个适配器共享，最后一个任务结束时才释放
+        self._source_refs: Dict[str, int] = {}
+        self._source_lock = threading.Lock()
+            
         self.logger.info(f"初始化音频分割器: 最大线程数={self.max_workers}, PyAV可用={PYAV_AVAILABLE}")
     
+    def _get_source_audio(self, audio_file: str) -> Any:
+        """获取已解码的源音频，首次调用的线程负责加载，其余线程等待并复用同一份数据"""
+        # 锁内只登记Future，解码在锁外进行，不阻塞其他文件的分割任务和引用计数更新
+        with self._source_lock:
+            future = self._source_audio.get(audio_file)
+            is_loader = future is None
+            if is_loader:
+                future = Future()
+                self._source_audio[audio_file] = future
+        
+        if is_loader:
+            try:
+                self.logger.debug(f"加载音频文件: {audio_file}")
+                future.set_result(AudioUtils.load_audio(audio_file))
+            except BaseException as e:
+                future.set_exception(e)
+                # 加载失败时移除该Future，之后的调用可以重新加载
+                with self._source_lock:
+                    if self._source_audio.get(audio_file) is future:
+                        del self._source_audio[audio_file]
+        
+        return future.result()
+    
+    @staticmethod
+    def segment_filename(idx: int, segment_options: SegmentOptions, output_format: str) -> str:
+        """生成片段输出文件名：序号 + 片段文本前30个字符"""
+        segment_text = segment_options.text.strip()[:30]
+        safe_filename = AudioUtils.make_safe_filename(segment_text)
+        return f"{idx+1:03d}_{safe_filename}.{output_format}"
+    
     def prepare_segments(self, segments: List[Dict[str, Any]], min_length: float = 3.0, 
                         max_length: float = 60.0, preserve_sentences: bool = True) -> List[Dict[str, Any]]:
         """
@@ -179,7 +217,9 @@ class AudioSplitter:
         return processed_segments
     
     def _split_segment(self, audio_file: str, segment_options: SegmentOptions, 
-                      output_file: str, split_options: SplitOptions) -> bool:
+                      output_file: str, split_options: SplitOptions,
+                      codec_threads: Optional[int] = None,
+                      bounds_ms: Optional[Tuple[int, int]] = None) -> bool:
         """
         分割单个音频片段
         
@@ -188,15 +228,18 @@ class AudioSplitter:
             segment_options: 分段选项
             output_file: 输出文件路径
             split_options: 分割选项
+            codec_threads: 编解码线程数，None表示使用编解码器默认值
+            bounds_ms: 预先计算好的 (开始, 结束) 毫秒数，None时根据segment_options计算
             
         Returns:
             分割是否成功
         """
         try:
-            start_time = segment_options.start
-            end_time = segment_options.end
+            if bounds_ms is None:
+                bounds_ms = (int(segment_options.start * 1000), int(segment_options.end * 1000))
+            start_ms, end_ms = bounds_ms
             
-            self.logger.debug(f"分割音频片段: {start_time:.2f}s - {end_time:.2f}s -> {output_file}")
+            self.logger.debug(f"分割音频片段: {start_ms}ms - {end_ms}ms -> {output_file}")
             
             # 获取音频文件类型
             _, ext = os.path.splitext(audio_file)
@@ -207,45 +250,47 @@ class AudioSplitter:
                 os.makedirs(output_dir, exist_ok=True)
             
             # 如果PyAV可用，使用PyAV切割
+            success = False
             if PYAV_AVAILABLE and ext.lower() in ['.mp3', '.wav', '.ogg', '.m4a', '.flac']:
                 success = self._split_with_pyav(
-                    audio_file, start_time, end_time, output_file, split_options
+                    audio_file, start_ms, end_ms, output_file, split_options, codec_threads
                 )
-                if success:
-                    return True
-                self.logger.warning(f"PyAV分割失败，回退到传统方法")
+                if not success:
+                    self.logger.warning(f"PyAV分割失败，回退到传统方法")
             
             # 回退到传统方法(pydub)
-            return self._split_with_pydub(
-                audio_file, start_time, end_time, output_file, split_options
-            )
+            if not success:
+                success = self._split_with_pydub(
+                    audio_file, start_ms, end_ms, output_file, split_options, codec_threads
+                )
+            
+            # 输出片段是一次性写入的数据，提示内核不必保留在页缓存中，避免挤出其他热数据
+            if success:
+                AudioUtils.fadvise(output_file, 'POSIX_FADV_DONTNEED')
+            return success
             
         except Exception as e:
+            # logger.exception 已包含堆栈信息，无需再额外格式化traceback
             self.logger.exception(f"分割音频片段失败: {str(e)}")
-            import traceback
-            self.logger.error(f"详细错误: {traceback.format_exc()}")
             return False
     
-    def _split_with_pyav(self, audio_file: str, start_time: float, end_time: float, 
-                        output_file: str, split_options: SplitOptions) -> bool:
+    def _split_with_pyav(self, audio_file: str, start_ms: int, end_ms: int, 
+                        output_file: str, split_options: SplitOptions,
+                        codec_threads: Optional[int] = None) -> bool:
         """使用PyAV分割音频（更高效）"""
         try:
             format_options = split_options.get_format_options()
             
-            # 计算时间点（秒）
-            start_sec = float(start_time)
-            end_sec = float(end_time)
-            
             # 打开输入文件
             input_container = av.open(audio_file)
             
             # 找到音频流
             audio_stream = next(s for s in input_container.streams if s.type == 'audio')
             
-            # 计算时间戳（使用timebase）
+            # 计算时间戳（使用timebase，整数运算避免浮点误差）
             time_base = audio_stream.time_base
-            start_ts = int(start_sec / time_base)
-            end_ts = int(end_sec / time_base)
+            start_ts = start_ms * time_base.denominator // (1000 * time_base.numerator)
+            end_ts = end_ms * time_base.denominator // (1000 * time_base.numerator)
             
             # 创建输出容器
             output_container = av.open(output_file, 'w')
@@ -253,6 +298,11 @@ class AudioSplitter:
             # 添加音频流
             output_stream = output_container.add_stream(template=audio_stream)
             
+            # 外层线程池已并行处理时，限制编解码器内部线程数，避免CPU超额订阅
+            if codec_threads:
+                audio_stream.codec_context.thread_count = codec_threads
+                output_stream.codec_context.thread_count = codec_threads
+            
             # 设置输出质量（如果适用）
             if split_options.output_format == 'mp3':
                 bitrate = format_options.get('bitrate', '128k')
@@ -292,19 +342,16 @@ class AudioSplitter:
             self.logger.warning(f"使用PyAV分割音频失败: {str(e)}")
             return False
     
-    def _split_with_pydub(self, audio_file: str, start_time: float, end_time: float, 
-                         output_file: str, split_options: SplitOptions) -> bool:
+    def _split_with_pydub(self, audio_file: str, start_ms: int, end_ms: int, 
+                         output_file: str, split_options: SplitOptions,
+                         codec_threads: Optional[int] = None) -> bool:
         """使用pydub分割音频（更兼容）"""
+        part_file = None
         try:
             format_options = split_options.get_format_options()
             
-            # 加载音频文件
-            self.logger.debug(f"加载音频文件: {audio_file}")
-            audio_segment = AudioUtils.load_audio(audio_file)
-            
-            # 计算时间点（毫秒）
-            start_ms = int(start_time * 1000)
-            end_ms = int(end_time * 1000)
+            # 加载音频文件（同一任务内只解码一次）
+            audio_segment = self._get_source_audio(audio_file)
             
             # 提取片段
             self.logger.debug(f"提取音频片段: {start_ms}ms - {end_ms}ms")
@@ -315,29 +362,37 @@ class AudioSplitter:
             
             self.logger.debug(f"导出音频片段为 {format_type} 格式: {output_file}")
             
-            # 根据格式和质量选择导出参数
-            if format_type == 'mp3':
-                bitrate = format_options.get('bitrate', '128k')
-                extract.export(output_file, format="mp3", bitrate=bitrate)
-                
-            elif format_type == 'wav':
-                # WAV通常不压缩，质量设置主要影响采样率
-                sample_rate = format_options.get('sample_rate', 44100)
-                parameters = ["-ar", str(sample_rate)]
-                extract.export(output_file, format="wav", parameters=parameters)
-                
-            elif format_type == 'ogg':
-                quality = str(format_options.get('quality', 5))  # 0-10
-                extract.export(output_file, format="ogg", quality=quality)
-                
-            else:
-                # 默认其他格式
-                extract.export(output_file, format=format_type)
+            # 外层线程池已并行处理时，限制ffmpeg内部线程数，避免CPU超额订阅
+            thread_params = ["-threads", str(codec_threads)] if codec_threads else []
+            
+            # 先导出到同目录下的临时文件，成功后再原子替换为最终文件，避免中途失败留下不完整的片段
+            part_file = f"{output_file}.part"
+            
+            # 根据格式和质量选择导出参数（由调用方打开文件，确保导出后文件句柄被关闭）
+            with open(part_file, 'wb') as part_f:
+                if format_type == 'mp3':
+                    bitrate = format_options.get('bitrate', '128k')
+                    extract.export(part_f, format="mp3", bitrate=bitrate, parameters=thread_params)
+                    
+                elif format_type == 'wav':
+                    # WAV通常不压缩，质量设置主要影响采样率
+                    sample_rate = format_options.get('sample_rate', 44100)
+                    parameters = ["-ar", str(sample_rate)] + thread_params
+                    extract.export(part_f, format="wav", parameters=parameters)
+                    
+                elif format_type == 'ogg':
+                    quality = str(format_options.get('quality', 5))  # 0-10
+                    extract.export(part_f, format="ogg", quality=quality, parameters=thread_params)
+                    
+                else:
+                    # 默认其他格式
+                    extract.export(part_f, format=format_type, parameters=thread_params)
             
             # 验证导出是否成功
-            if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+            if not os.path.exists(part_file) or os.path.getsize(part_file) == 0:
                 self.logger.error(f"导出失败: 输出文件 {output_file} 不存在或为空")
                 return False
+            os.replace(part_file, output_file)
             
             file_size = os.path.getsize(output_file) / 1024  # KB
             self.logger.info(f"成功导出音频片段: {output_file} ({file_size:.2f} KB)")
@@ -346,6 +401,10 @@ class AudioSplitter:
         except Exception as e:
             self.logger.exception(f"使用pydub分割音频失败: {str(e)}")
             return False
+        finally:
+            # 清理未能替换为最终文件的临时文件
+            if part_file and os.path.exists(part_file):
+                os.remove(part_file)
     
     def split(self, audio_file: str, segment_options_list: List[SegmentOptions], 
              output_dir: str, options: Optional[SplitOptions] = None, 
@@ -372,14 +431,20 @@ class AudioSplitter:
             self.logger.error(f"音频文件不存在: {audio_file}")
             return []
         
+        with self._source_lock:
+            self._source_refs[audio_file] = self._source_refs.get(audio_file, 0) + 1
+        
         try:
             # 获取音频信息
-            audio_info = AudioUtils.get_audio_info(audio_file)
+            audio_info = AudioUtils.get_cached_audio_info(audio_file)
             self.logger.info(f"音频信息: 时长={audio_info.get('duration', 'unknown')}秒, "
                             f"格式={audio_info.get('format', 'unknown')}, "
                             f"比特率={audio_info.get('bit_rate', 'unknown')}")
             audio_duration = float(audio_info.get('duration', 0))
             
+            # 源文件会被各片段顺序读取，提示内核加大预读
+            AudioUtils.fadvise(audio_file, 'POSIX_FADV_SEQUENTIAL')
+            
             # 验证输出目录
             if not os.path.exists(output_dir):
                 os.makedirs(output_dir, exist_ok=True)
@@ -395,17 +460,28 @@ class AudioSplitter:
             # 创建一个线程安全的计数器
             progress_counter = {"current": 0, "total": len(segment_options_list), "lock": threading.Lock()}
             
+            # 一次性批量计算所有片段的毫秒边界，结束时间不超过音频总时长
+            total_ms = int(audio_duration * 1000) if audio_duration > 0 else None
+            bounds_ms_list = [
+                (int(opt.start * 1000), int(opt.end * 1000)) for opt in segment_options_list
+            ]
+            if total_ms is not None:
+                bounds_ms_list = [(start, min(end, total_ms)) for start, end in bounds_ms_list]
+            
+            # 多个片段并行处理时，每个编解码器只使用单线程；单个片段时保留编解码器默认线程数
+            codec_threads = 1 if self.max_workers > 1 and len(segment_options_list) > 1 else None
+            
             # 定义分割任务
             def split_task(idx, segment_opt):
                 try:
                     # 创建输出文件名
-                    segment_text = segment_opt.text.strip()[:30]
-                    safe_filename = AudioUtils.make_safe_filename(segment_text)
-                    output_filename = f"{idx+1:03d}_{safe_filename}.{options.output_format}"
+                    output_filename = self.segment_filename(idx, segment_opt, options.output_format)
                     output_path = os.path.join(output_dir, output_filename)
                     
                     # 分割片段
-                    success = self._split_segment(audio_file, segment_opt, output_path, options)
+                    success = self._split_segment(
+                        audio_file, segment_opt, output_path, options, codec_threads, bounds_ms_list[idx]
+                    )
                     
                     # 更新进度
                     with progress_counter["lock"]:
@@ -416,7 +492,7 @@ class AudioSplitter:
                     if on_progress:
                         on_progress(current, total)
                     
-                    self.logger.info(f"处理进度: {current}/{total} - 完成度: {current/total*100:.1f}%")
+                    self.logger.debug("处理进度: %d/%d - 完成度: %.1f%%", current, total, current / total * 100)
                     
                     if success:
                         return output_path
@@ -457,4 +533,13 @@ class AudioSplitter:
             
         except Exception as e:
             self.logger.exception(f"分割音频文件失败: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+        finally:
+            # 使用该源文件的最后一个任务结束后释放已解码的源音频
+            with self._source_lock:
+                refs = self._source_refs.get(audio_file, 1) - 1
+                if refs > 0:
+                    self._source_refs[audio_file] = refs
+                else:
+                    self._source_refs.pop(audio_file, None)
+                    self._source_audio.pop(audio_file, None)
\ No newline at end of file
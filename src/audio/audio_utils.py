@@ -8,6 +8,7 @@ import logging
 import tempfile
 import wave
 import contextlib
+from functools import lru_cache
 from typing import Dict, Any, Optional, Union
 from pathlib import Path
 
@@ -17,6 +18,17 @@ try:
 except ImportError:
     PYDUB_AVAILABLE = False
 
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+@lru_cache(maxsize=128)
+def _cached_audio_info(audio_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """按 (路径, 修改时间, 文件大小) 缓存音频信息，文件被改写后键随之变化，自动失效"""
+    return AudioUtils.get_audio_info(audio_path)
+
 class AudioUtils:
     """音频处理工具类"""
     
@@ -146,18 +158,10 @@ class AudioUtils:
             except Exception as e:
                 AudioUtils.logger.warning(f"使用wave模块获取WAV文件信息失败: {str(e)}")
         
-        # 尝试使用pydub获取音频信息
-        if PYDUB_AVAILABLE:
-            try:
-                audio = AudioUtils.load_audio(audio_path)
-                info["duration"] = len(audio) / 1000.0  # pydub以毫秒为单位
-                info["sample_rate"] = audio.frame_rate
-                info["channels"] = audio.channels
-                info["sample_width"] = audio.sample_width
-                AudioUtils.logger.info(f"使用pydub获取到音频信息: {info}")
-                return info
-            except Exception as e:
-                AudioUtils.logger.warning(f"使用pydub获取音频信息失败: {str(e)}")
+        # 尝试在进程内使用PyAV读取文件头，无需启动子进程或解码整个文件
+        if PYAV_AVAILABLE and AudioUtils._probe_with_pyav(audio_path, info):
+            AudioUtils.logger.info(f"使用PyAV获取到音频信息: {info}")
+            return info
         
         # 尝试使用ffprobe获取音频信息
         try:
@@ -202,6 +206,19 @@ class AudioUtils:
         except Exception as e:
             AudioUtils.logger.warning(f"使用ffprobe获取音频信息失败: {str(e)}")
         
+        # 尝试使用pydub获取音频信息（需要解码整个文件，作为最后的手段）
+        if PYDUB_AVAILABLE:
+            try:
+                audio = AudioUtils.load_audio(audio_path)
+                info["duration"] = len(audio) / 1000.0  # pydub以毫秒为单位
+                info["sample_rate"] = audio.frame_rate
+                info["channels"] = audio.channels
+                info["sample_width"] = audio.sample_width
+                AudioUtils.logger.info(f"使用pydub获取到音频信息: {info}")
+                return info
+            except Exception as e:
+                AudioUtils.logger.warning(f"使用pydub获取音频信息失败: {str(e)}")
+        
         # 至少确保获取时长
         if info["duration"] == 0:
             info["duration"] = AudioUtils.get_audio_duration(audio_path)
@@ -213,6 +230,78 @@ class AudioUtils:
         AudioUtils.logger.error(f"无法获取任何音频信息: {audio_path}")
         raise RuntimeError(f"无法获取音频信息: {audio_path}")
     
+    @staticmethod
+    def _probe_with_pyav(audio_path: str, info: Dict[str, Any]) -> bool:
+        """使用PyAV读取容器和音频流头信息填充info，成功返回True"""
+        try:
+            with av.open(audio_path) as container:
+                if not container.streams.audio:
+                    return False
+                stream = container.streams.audio[0]
+                codec_context = stream.codec_context
+                
+                if container.duration is not None:
+                    info["duration"] = container.duration / av.time_base
+                elif stream.duration is not None and stream.time_base is not None:
+                    info["duration"] = float(stream.duration * stream.time_base)
+                
+                info["sample_rate"] = codec_context.sample_rate or 0
+                layout = getattr(codec_context, 'layout', None)
+                info["channels"] = getattr(codec_context, 'channels', None) or (
+                    len(layout.channels) if layout is not None else 0)
+                if container.bit_rate:
+                    info["bit_rate"] = container.bit_rate
+            return info["duration"] > 0
+        except Exception as e:
+            AudioUtils.logger.warning(f"使用PyAV获取音频信息失败: {str(e)}")
+            return False
+    
+    @staticmethod
+    def fadvise(file_path: str, advice_name: str) -> bool:
+        """
+        向内核提示文件的访问模式（仅支持posix_fadvise的平台，如Linux）
+        
+        Args:
+            file_path: 文件路径
+            advice_name: os模块中的建议常量名，如 POSIX_FADV_SEQUENTIAL、POSIX_FADV_DONTNEED
+            
+        Returns:
+            是否成功设置
+        """
+        advice = getattr(os, advice_name, None)
+        if advice is None or not hasattr(os, 'posix_fadvise'):
+            return False
+        
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, advice)
+            finally:
+                os.close(fd)
+            return True
+        except OSError as e:
+            AudioUtils.logger.debug(f"设置文件访问建议失败: {file_path}, {advice_name}, {str(e)}")
+            return False
+    
+    @staticmethod
+    def get_cached_audio_info(audio_path: str, stat: Optional[os.stat_result] = None) -> Dict[str, Any]:
+        """
+        获取音频文件信息，文件未变化时复用进程内缓存的结果，避免重复运行ffprobe等探测
+        
+        Args:
+            audio_path: 音频文件路径
+            stat: 调用方已获取的os.stat结果，传入时不再重复stat
+        """
+        if stat is None:
+            try:
+                stat = os.stat(audio_path)
+            except FileNotFoundError:
+                AudioUtils.logger.error(f"文件不存在: {audio_path}")
+                raise FileNotFoundError(f"文件不存在: {audio_path}")
+        
+        # 返回副本，防止调用方修改缓存中的数据
+        return dict(_cached_audio_info(audio_path, stat.st_mtime_ns, stat.st_size))
+    
     @staticmethod
     def make_safe_filename(text: str) -> str:
         """将文本转换为安全的文件名"""
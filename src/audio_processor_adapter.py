@@ -2,21 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import os
-import tempfile
-import shutil
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import threading
+import time
 from src.utils.logging_config import LoggingConfig
 
 # 导入新的音频处理组件
 from .audio import AudioConverter, AudioSplitter, SplitOptions, SegmentOptions, AudioUtils
 from .temp import TempFileManager, get_global_manager
 
+# CPU核心数在进程生命周期内不变，只获取一次（获取失败时默认为4）
+_CPU_COUNT = os.cpu_count() or 4
+
+# 按最大线程数共享的音频分割器，避免每个请求创建的适配器都各自持有一个分割器
+_SPLITTER_CACHE = {}
+_SPLITTER_LOCK = threading.Lock()
+
+def _get_shared_splitter(max_workers):
+    """获取指定最大线程数的共享音频分割器，不存在时创建"""
+    with _SPLITTER_LOCK:
+        splitter = _SPLITTER_CACHE.get(max_workers)
+        if splitter is None:
+            splitter = AudioSplitter(max_workers=max_workers)
+            _SPLITTER_CACHE[max_workers] = splitter
+        return splitter
+
 class AudioProcessorAdapter:
     """
     适配器类，提供与旧版AudioProcessor兼容的接口，但内部使用新的音频处理组件
     """
     
+    # 片段数达到该值时，使用单次解码的FFmpeg批量分割
+    BATCH_SPLIT_MIN_SEGMENTS = 4
+    # 单次FFmpeg调用最多输出的片段数，避免滤镜图过大和同时打开过多输出文件
+    BATCH_SPLIT_MAX_SEGMENTS = 32
+    
     def __init__(self, use_disk_processing=True, chunk_size_mb=200, max_workers=None, auto_cleanup=True):
         """
         初始化音频处理器适配器
@@ -32,28 +53,27 @@ class AudioProcessorAdapter:
         # 初始化临时文件管理器
         self.temp_manager = TempFileManager(prefix="audio_processor_")
         
-        # 初始化重要文件列表，防止被自动清理
-        self.important_files = []
+        # 初始化重要文件集合，防止被自动清理
+        self.important_files = set()
         
         # 创建音频转换器
         self.converter = AudioConverter()
         
         # 设置最大线程数，默认为CPU核心数-1（至少为2）
         if max_workers is None:
-            cpu_count = os.cpu_count() or 4  # 如果获取失败，默认为4
-            self.max_workers = max(2, cpu_count - 1)  # 至少为2
+            self.max_workers = max(2, _CPU_COUNT - 1)  # 至少为2
         else:
             self.max_workers = max(2, max_workers)  # 确保至少为2
         
-        # 创建音频分割器
-        self.splitter = AudioSplitter(max_workers=self.max_workers)
+        # 获取共享的音频分割器（分割器不保存适配器的状态，文件保护仍按实例区分）
+        self.splitter = _get_shared_splitter(self.max_workers)
         
         # 保存参数配置
         self.use_disk_processing = use_disk_processing
         self.chunk_size_mb = chunk_size_mb
         self.auto_cleanup = auto_cleanup
         
-        self.logger.info(f"初始化AudioProcessorAdapter: 硬盘处理={use_disk_processing}, 分块大小={chunk_size_mb}MB, 最大线程数={self.max_workers}, 自动清理={auto_cleanup}, CPU核心数={os.cpu_count()}")
+        self.logger.info(f"初始化AudioProcessorAdapter: 硬盘处理={use_disk_processing}, 分块大小={chunk_size_mb}MB, 最大线程数={self.max_workers}, 自动清理={auto_cleanup}, CPU核心数={_CPU_COUNT}")
     
     @property
     def temp_dir(self):
@@ -68,11 +88,11 @@ class AudioProcessorAdapter:
             
         # 确保important_files属性存在
         if not hasattr(self, 'important_files'):
-            self.important_files = []
+            self.important_files = set()
             
-        # 添加到important_files列表
+        # 添加到important_files集合
         if file_path not in self.important_files:
-            self.important_files.append(file_path)
+            self.important_files.add(file_path)
             self.logger.info(f"添加到internal保护列表: {file_path}")
             
         # 同时添加到TempFileManager的保护列表
@@ -81,6 +101,132 @@ class AudioProcessorAdapter:
         
         return True
     
+    @staticmethod
+    def _batch_codec_args(split_options):
+        """获取批量分割时的FFmpeg输出编码参数，不支持的格式返回None"""
+        output_format = split_options.output_format.lower()
+        format_options = split_options.get_format_options()
+        if output_format == 'mp3':
+            return ('-c:a', 'libmp3lame', '-b:a', format_options.get('bitrate', '128k'))
+        elif output_format == 'wav':
+            return ('-c:a', 'pcm_s16le', '-ar', str(format_options.get('sample_rate', 44100)))
+        elif output_format == 'ogg':
+            return ('-c:a', 'libvorbis', '-q:a', str(format_options.get('quality', 5)))
+        return None
+    
+    def _build_concat_ffmpeg_cmd(self, audio_path, indexed_segments, output_dir, split_options, codec_args):
+        """
+        构建单次解码、多路输出的FFmpeg分割命令
+        
+        源音频只解码一次，经asplit复制为K路，每路用atrim截取一个片段并编码到独立的输出文件。
+        
+        Args:
+            audio_path: 音频文件路径
+            indexed_segments: [(全局序号, SegmentOptions)] 列表，序号用于生成与AudioSplitter一致的文件名
+            output_dir: 输出目录
+            split_options: 分割选项
+            codec_args: 输出编码参数
+            
+        Returns:
+            (命令参数列表, 输出文件路径列表)
+        """
+        count = len(indexed_segments)
+        labels = ''.join(f'[a{i}]' for i in range(count))
+        filters = [f'[0:a]asplit={count}{labels}']
+        output_args = []
+        output_files = []
+        
+        for i, (idx, segment) in enumerate(indexed_segments):
+            filters.append(
+                f'[a{i}]atrim=start={segment.start:.3f}:end={segment.end:.3f},asetpts=PTS-STARTPTS[o{i}]'
+            )
+            output_path = os.path.join(
+                output_dir, AudioSplitter.segment_filename(idx, segment, split_options.output_format)
+            )
+            output_args += ['-map', f'[o{i}]', *codec_args, output_path]
+            output_files.append(output_path)
+        
+        cmd = ['ffmpeg', '-v', 'error', '-y', '-i', audio_path, '-filter_complex', ';'.join(filters)] + output_args
+        return cmd, output_files
+    
+    def _batch_split(self, audio_path, segment_options_list, output_dir, split_options, progress_callback=None):
+        """
+        使用FFmpeg滤镜图批量分割音频，每批片段只解码一次源文件
+        
+        Returns:
+            输出文件路径列表；格式不支持或任一批次失败时返回空列表，由调用方回退到逐段分割
+        """
+        codec_args = self._batch_codec_args(split_options)
+        if codec_args is None:
+            return []
+        
+        indexed_segments = list(enumerate(segment_options_list))
+        total = len(indexed_segments)
+        batches = [
+            indexed_segments[batch_start:batch_start + self.BATCH_SPLIT_MAX_SEGMENTS]
+            for batch_start in range(0, total, self.BATCH_SPLIT_MAX_SEGMENTS)
+        ]
+        
+        # 单批次直接在当前线程执行
+        if len(batches) == 1:
+            output_files = self._run_split_batch(audio_path, batches[0], output_dir, split_options, codec_args, total)
+            if output_files is None:
+                return []
+            if progress_callback:
+                progress_callback(f"分割进度 {total}/{total}", 100)
+            return sorted(output_files)
+        
+        # 多批次相互独立，FFmpeg在子进程中运行，使用线程池并行执行
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        output_files = []
+        done = 0
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=max(2, self.max_workers // 2)) as executor:
+            futures = {
+                executor.submit(
+                    self._run_split_batch, audio_path, batch, output_dir, split_options, codec_args, total
+                ): batch
+                for batch in batches
+            }
+            
+            for future in as_completed(futures):
+                batch_files = future.result()
+                if batch_files is None:
+                    for pending in futures:
+                        pending.cancel()
+                    return []
+                
+                # 进度回调属于调用方代码，加锁保证串行调用
+                with lock:
+                    output_files.extend(batch_files)
+                    done += len(futures[future])
+                    if progress_callback:
+                        progress_callback(f"分割进度 {done}/{total}", int(done / total * 100))
+        
+        return sorted(output_files)
+    
+    def _run_split_batch(self, audio_path, batch, output_dir, split_options, codec_args, total):
+        """
+        执行一个批次的FFmpeg分割
+        
+        Returns:
+            该批次的输出文件路径列表，失败时返回None
+        """
+        cmd, batch_files = self._build_concat_ffmpeg_cmd(audio_path, batch, output_dir, split_options, codec_args)
+        
+        self.logger.debug(f"批量分割片段 {batch[0][0] + 1}-{batch[-1][0] + 1}/{total}")
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            self.logger.warning(f"FFmpeg批量分割失败，回退到逐段分割: {result.stderr.strip()}")
+            return None
+        
+        for output_path in batch_files:
+            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+                self.logger.warning(f"FFmpeg批量分割输出为空，回退到逐段分割: {output_path}")
+                return None
+        return batch_files
+    
     def extract_audio(self, file_path, progress_callback=None):
         """
         从文件中提取音频（兼容旧接口）
@@ -107,16 +253,18 @@ class AudioProcessorAdapter:
             output_audio_path = self.converter.extract_audio(
                 file_path, 
                 output_format="wav",
-                temp_manager=self.temp_manager
+                temp_manager=self.temp_manager,
+                progress_callback=(lambda percent: progress_callback(f"提取音频中... {percent}%", 10 + percent * 80 // 100))
+                    if progress_callback else None
             )
             
             # 确保important_files属性存在
             if not hasattr(self, 'important_files'):
-                self.important_files = []
+                self.important_files = set()
                 
-            # 将提取的文件添加到不清理列表
+            # 将提取的文件添加到不清理集合
             if output_audio_path and output_audio_path not in self.important_files:
-                self.important_files.append(output_audio_path)
+                self.important_files.add(output_audio_path)
                 self.logger.info(f"添加到保护列表，防止被清理: {output_audio_path}")
                 
                 # 同时添加到TempFileManager的保护列表
@@ -134,6 +282,61 @@ class AudioProcessorAdapter:
                 progress_callback(f"提取失败: {str(e)}", 0)
             return None
     
+    @staticmethod
+    def _throttle_split_progress(progress_callback, min_interval=0.1, min_percent_step=5):
+        """
+        包装分割进度回调，两次回调至少间隔min_interval秒或进度变化min_percent_step%，最后一次总会回调
+        
+        Args:
+            progress_callback: 进度回调函数 (message, percent) -> None
+            min_interval: 最小回调间隔(秒)
+            min_percent_step: 最小进度变化(%)
+            
+        Returns:
+            分割器使用的进度回调函数 (current, total) -> None
+        """
+        last = [0.0, -min_percent_step]
+        lock = threading.Lock()
+        
+        def on_progress(current, total):
+            percent = current * 100 // total
+            now = time.monotonic()
+            with lock:
+                if current != total and now - last[0] < min_interval and percent - last[1] < min_percent_step:
+                    return
+                last[0] = now
+                last[1] = percent
+                progress_callback("分割进度 %d/%d" % (current, total), percent)
+        
+        return on_progress
+    
+    def _build_segment_options(self, segments):
+        """将分段字典转换为SegmentOptions列表，跳过无效的时间段，无效项汇总后只记录一次日志"""
+        # 每个分段在各自的try中解析时间和文本，单个分段数据有误时只跳过该分段
+        parsed = []
+        for i, segment in enumerate(segments):
+            try:
+                parsed.append((
+                    float(segment.get("start", 0)),
+                    float(segment.get("end", 0)),
+                    (segment.get("text") or "").strip()
+                ))
+            except Exception as e:
+                self.logger.error(f"处理分段{i}时出错: {str(e)}")
+                parsed.append(None)
+        
+        segment_options_list = [
+            SegmentOptions(start=entry[0], end=entry[1], text=entry[2])
+            for entry in parsed
+            if entry is not None and entry[1] > entry[0]
+        ]
+        
+        invalid_indices = [i for i, entry in enumerate(parsed) if entry is not None and entry[1] <= entry[0]]
+        if invalid_indices:
+            self.logger.warning(f"跳过{len(invalid_indices)}个无效的时间段: 段落{invalid_indices}")
+        
+        return segment_options_list
+    
     def split_audio(self, audio_path, segments, output_dir, output_format="mp3", quality="medium", progress_callback=None):
         """
         根据时间段列表分割音频（兼容旧接口）
@@ -149,27 +352,43 @@ class AudioProcessorAdapter:
         Returns:
             输出文件路径列表，如果失败则返回空列表
         """
-        if not os.path.exists(audio_path):
+        # 一次stat同时完成存在性检查和缓存键计算
+        try:
+            audio_stat = os.stat(audio_path)
+        except FileNotFoundError:
+            audio_stat = None
+        
+        if audio_stat is None:
             error_msg = f"音频文件不存在: {audio_path}"
             self.logger.error(error_msg)
             
-            # 如果原始路径不存在，尝试检查是否存在于其他可能的位置
-            possible_paths = [
-                os.path.join(self.temp_dir, "original_extracted.wav"),
-                os.path.join(os.path.dirname(audio_path), "original_extracted.wav"),
-                # 添加更多可能的路径
-                os.path.join(os.path.dirname(os.path.dirname(audio_path)), "original_extracted.wav"),
-                os.path.join(tempfile.gettempdir(), "original_extracted.wav")
+            # 如果原始路径不存在，尝试在其他可能的位置查找，取最新的一个
+            import glob
+            import tempfile
+            search_patterns = [
+                os.path.join(glob.escape(self.temp_dir), "**", "original_extracted.wav"),
+                os.path.join(glob.escape(os.path.dirname(audio_path)), "original_extracted.wav"),
+                os.path.join(glob.escape(os.path.dirname(os.path.dirname(audio_path))), "original_extracted.wav"),
+                os.path.join(glob.escape(tempfile.gettempdir()), "original_extracted.wav")
             ]
             
-            for possible_path in possible_paths:
-                if os.path.exists(possible_path):
-                    self.logger.info(f"找到可能的替代音频文件: {possible_path}")
-                    audio_path = possible_path
-                    break
+            candidates = {}
+            for pattern in search_patterns:
+                for possible_path in glob.glob(pattern, recursive=True):
+                    if possible_path in candidates:
+                        continue
+                    try:
+                        candidates[possible_path] = os.stat(possible_path)
+                    except FileNotFoundError:
+                        continue
+            
+            if candidates:
+                audio_path = max(candidates, key=lambda path: candidates[path].st_mtime)
+                audio_stat = candidates[audio_path]
+                self.logger.info(f"找到可能的替代音频文件: {audio_path}")
             
             # 如果仍然找不到文件，返回错误
-            if not os.path.exists(audio_path):
+            if audio_stat is None:
                 if progress_callback:
                     progress_callback(error_msg, 0)
                 return []
@@ -177,23 +396,21 @@ class AudioProcessorAdapter:
         # 将音频文件添加到重要文件列表，防止被清理
         self.protect_file(audio_path)
         
-        if not os.path.exists(output_dir):
-            try:
-                self.logger.info(f"输出目录不存在，尝试创建: {output_dir}")
-                os.makedirs(output_dir, exist_ok=True)
-            except Exception as e:
-                error_msg = f"创建输出目录失败: {str(e)}"
-                self.logger.error(error_msg)
-                if progress_callback:
-                    progress_callback(error_msg, 0)
-                return []
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except Exception as e:
+            error_msg = f"创建输出目录失败: {str(e)}"
+            self.logger.error(error_msg)
+            if progress_callback:
+                progress_callback(error_msg, 0)
+            return []
         
         # 打印调试信息
-        self.logger.info(f"开始分割音频: {audio_path}")
-        self.logger.info(f"输出目录: {output_dir}")
-        self.logger.info(f"分段数量: {len(segments)}")
-        self.logger.info(f"输出格式: {output_format}")
-        self.logger.info(f"输出质量: {quality}")
+        self.logger.info("开始分割音频: %s (%.2fMB)", audio_path, audio_stat.st_size / (1024 * 1024))
+        self.logger.info("输出目录: %s", output_dir)
+        self.logger.info("分段数量: %d", len(segments))
+        self.logger.info("输出格式: %s", output_format)
+        self.logger.info("输出质量: %s", quality)
         
         try:
             # 验证音频文件是否存在且可读
@@ -206,8 +423,8 @@ class AudioProcessorAdapter:
 
             # 验证音频文件是否有效
             try:
-                audio_info = AudioUtils.get_audio_info(audio_path)
-                self.logger.info(f"音频信息: {audio_info}")
+                audio_info = AudioUtils.get_cached_audio_info(audio_path, audio_stat)
+                self.logger.info("音频信息: %s", audio_info)
             except Exception as e:
                 error_msg = f"无法获取音频信息，文件可能损坏: {str(e)}"
                 self.logger.error(error_msg)
@@ -226,26 +443,7 @@ class AudioProcessorAdapter:
             )
             
             # 准备分段选项
-            segment_options_list = []
-            for i, segment in enumerate(segments):
-                try:
-                    start_time = float(segment.get("start", 0))
-                    end_time = float(segment.get("end", 0))
-                    text = segment.get("text", "").strip()
-                    
-                    # 验证时间段是否有效
-                    if end_time <= start_time:
-                        self.logger.warning(f"跳过无效的时间段: 段落{i}, 开始={start_time}, 结束={end_time}")
-                        continue
-                    
-                    segment_options = SegmentOptions(
-                        start=start_time,
-                        end=end_time,
-                        text=text
-                    )
-                    segment_options_list.append(segment_options)
-                except Exception as e:
-                    self.logger.error(f"处理分段{i}时出错: {str(e)}")
+            segment_options_list = self._build_segment_options(segments)
             
             # 检查是否有有效的分段
             if not segment_options_list:
@@ -255,17 +453,24 @@ class AudioProcessorAdapter:
                     progress_callback(error_msg, 0)
                 return []
             
+            # 片段较多时优先使用单次解码的FFmpeg批量分割
+            result = []
+            if len(segment_options_list) >= self.BATCH_SPLIT_MIN_SEGMENTS and self.converter.has_ffmpeg:
+                self.logger.info("使用FFmpeg批量分割，共%d个分段", len(segment_options_list))
+                result = self._batch_split(
+                    audio_path, segment_options_list, output_dir, split_options, progress_callback
+                )
+            
             # 使用新的分割器分割音频
-            self.logger.info(f"调用 AudioSplitter.split 方法，共{len(segment_options_list)}个分段")
-            result = self.splitter.split(
-                audio_path,
-                segment_options_list,
-                output_dir,
-                split_options,
-                on_progress=lambda current, total: 
-                    progress_callback(f"分割进度 {current}/{total}", int(current/total*100)) 
-                    if progress_callback else None
-            )
+            if not result:
+                self.logger.info("调用 AudioSplitter.split 方法，共%d个分段", len(segment_options_list))
+                result = self.splitter.split(
+                    audio_path,
+                    segment_options_list,
+                    output_dir,
+                    split_options,
+                    on_progress=self._throttle_split_progress(progress_callback) if progress_callback else None
+                )
             
             # 验证结果
             if not result:
@@ -276,9 +481,10 @@ class AudioProcessorAdapter:
                 return []
             
             # 打印结果
-            self.logger.info(f"分割结果: 成功生成{len(result)}个文件")
-            for i, file_path in enumerate(result):
-                self.logger.info(f"输出文件{i+1}: {file_path}")
+            self.logger.info("分割结果: 成功生成%d个文件", len(result))
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for i, file_path in enumerate(result):
+                    self.logger.debug("输出文件%d: %s", i + 1, file_path)
             
             # 完成进度
             if progress_callback:
@@ -289,8 +495,6 @@ class AudioProcessorAdapter:
         except Exception as e:
             error_msg = f"分割音频失败: {str(e)}"
             self.logger.exception(error_msg)
-            import traceback
-            self.logger.error(f"详细错误: {traceback.format_exc()}")
             if progress_callback:
                 progress_callback(f"分割失败: {str(e)}", 0)
             return []
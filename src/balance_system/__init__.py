@@ -2,9 +2,7 @@
 余额系统模块，负责用户充值、消费和余额管理
 """
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.exc import SQLAlchemyError
-from src.balance_system.db import init_db
+from src.balance_system.db import init_db, shutdown_session
 from flask import Blueprint
 
 # 初始化日志
@@ -18,9 +16,11 @@ def init_app(app):
     try:
         # 初始化数据库
         init_db()
+        # 请求结束时释放线程内的会话，各服务在同一请求内共用一个会话和连接
+        app.teardown_appcontext(shutdown_session)
         # 注册蓝图
         app.register_blueprint(bp, url_prefix='/api/balance')
-        print("余额系统初始化完成")
-    except Exception as e:
-        print(f"余额系统初始化失败: {str(e)}")
+        logger.info("余额系统初始化完成")
+    except Exception:
+        logger.exception("余额系统初始化失败")
         raise 
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+余额缓存模块，使用Redis缓存用户余额，减少每次请求查询数据库
+
+未安装redis库、未配置REDIS_URL或设置BALANCE_CACHE_ENABLED=0时缓存不生效，所有操作直接回退到数据库。
+"""
+import os
+import json
+import logging
+from typing import Optional, Dict, Any
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 余额缓存的有效期（秒）
+BALANCE_CACHE_TTL = int(os.environ.get('BALANCE_CACHE_TTL', '60'))
+
+_BALANCE_KEY_PREFIX = "balance:"
+
+_client = None
+_client_initialized = False
+
+def _get_client():
+    """获取Redis客户端，首次调用时创建；缓存不可用时返回None"""
+    global _client, _client_initialized
+    if _client_initialized:
+        return _client
+    
+    _client_initialized = True
+    redis_url = os.environ.get('REDIS_URL')
+    if not REDIS_AVAILABLE or not redis_url or os.environ.get('BALANCE_CACHE_ENABLED', '1') == '0':
+        return None
+    
+    try:
+        _client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        logger.info("余额缓存已启用")
+    except Exception as e:
+        logger.warning("创建Redis客户端失败，余额缓存不可用: %s", e)
+        _client = None
+    return _client
+
+def get_cached_balance(user_id: str) -> Optional[Dict[str, Any]]:
+    """获取缓存的用户余额信息，未命中或缓存不可用时返回None"""
+    client = _get_client()
+    if client is None:
+        return None
+    
+    try:
+        value = client.get(f"{_BALANCE_KEY_PREFIX}{user_id}")
+        return json.loads(value) if value else None
+    except Exception as e:
+        logger.warning("读取余额缓存失败: %s", e)
+        return None
+
+def set_cached_balance(user_id: str, balance: Dict[str, Any], ttl: int = BALANCE_CACHE_TTL) -> None:
+    """缓存用户余额信息"""
+    client = _get_client()
+    if client is None:
+        return
+    
+    try:
+        client.set(f"{_BALANCE_KEY_PREFIX}{user_id}", json.dumps(balance), ex=ttl)
+    except Exception as e:
+        logger.warning("写入余额缓存失败: %s", e)
+
+def invalidate_balance(*user_ids: str) -> None:
+    """使用户余额缓存失效，余额变更提交后调用"""
+    client = _get_client()
+    if client is None or not user_ids:
+        return
+    
+    try:
+        client.delete(*(f"{_BALANCE_KEY_PREFIX}{user_id}" for user_id in user_ids))
+    except Exception as e:
+        logger.warning("删除余额缓存失败: %s", e)
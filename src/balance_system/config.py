@@ -1,6 +1,10 @@
 import os
+import importlib.util
 from typing import Dict, Any
 
+# 默认使用C扩展实现的mysqlclient驱动，未安装时回退到纯Python的PyMySQL
+_DEFAULT_DB_DRIVER = 'mysqldb' if importlib.util.find_spec('MySQLdb') is not None else 'pymysql'
+
 class BaseDBConfig:
     """数据库基础配置"""
     # 数据库连接池配置
@@ -9,24 +13,47 @@ class BaseDBConfig:
     MAX_OVERFLOW = 10
     POOL_TIMEOUT = 30
     POOL_RECYCLE = 3600
+    POOL_PRE_PING = True
+    # SQL编译缓存的容量（条），缓存编译后的语句，相同结构的查询不再重复编译
+    QUERY_CACHE_SIZE = 1200
+    
+    # to_dict输出的配置项
+    _CONFIG_KEYS = (
+        'ENV', 'SQLALCHEMY_TRACK_MODIFICATIONS', 'SQLALCHEMY_DATABASE_URI',
+        'POOL_SIZE', 'MAX_OVERFLOW', 'POOL_TIMEOUT', 'POOL_RECYCLE', 'POOL_PRE_PING',
+        'QUERY_CACHE_SIZE',
+        'DB_DRIVER', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_NAME'
+    )
     
     def __init__(self):
         """初始化配置"""
+        # 连接池参数允许通过环境变量覆盖，未设置时使用类上的默认值
+        self.POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', self.POOL_SIZE))
+        self.MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', self.MAX_OVERFLOW))
+        self.POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', self.POOL_TIMEOUT))
+        self.POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', self.POOL_RECYCLE))
+        self.POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', str(self.POOL_PRE_PING)).lower() in ('1', 'true', 'yes')
+        self.QUERY_CACHE_SIZE = int(os.environ.get('DB_QUERY_CACHE_SIZE', self.QUERY_CACHE_SIZE))
+        
         self.DB_USER = os.environ.get('MYSQL_USER', 'audio_app_user')
         self.DB_PASSWORD = os.environ.get('MYSQL_PASSWORD', '')
         self.DB_PORT = os.environ.get('MYSQL_PORT', '3306')
         self.DB_NAME = os.environ.get('MYSQL_DATABASE', 'audio_app')
         self.DB_HOST = os.environ.get('MYSQL_HOST', 'localhost')
-    
-    @property
-    def SQLALCHEMY_DATABASE_URI(self) -> str:
-        """数据库连接URI"""
-        return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset=utf8mb4&connect_timeout=10&init_command=SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci"
+        # 数据库驱动: mysqldb (mysqlclient) 或 pymysql
+        self.DB_DRIVER = os.environ.get('DB_DRIVER', _DEFAULT_DB_DRIVER)
+        
+        # 数据库连接URI，在配置创建时生成一次
+        self.SQLALCHEMY_DATABASE_URI = f"mysql+{self.DB_DRIVER}://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset=utf8mb4&connect_timeout=10&init_command=SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci"
     
     def to_dict(self) -> Dict[str, Any]:
         """转换配置为字典"""
-        return {key: getattr(self, key) for key in dir(self) 
-                if key.isupper() and not key.startswith('_')}
+        # 配置在创建后不再变化，字典只在首次调用时生成，之后返回副本
+        config_dict = self.__dict__.get('_config_dict')
+        if config_dict is None:
+            config_dict = {key: getattr(self, key) for key in self._CONFIG_KEYS if hasattr(self, key)}
+            self._config_dict = config_dict
+        return dict(config_dict)
 
 class LocalDBConfig(BaseDBConfig):
     """本地开发数据库配置"""
@@ -48,16 +75,20 @@ class ProductionDBConfig(BaseDBConfig):
         if missing_vars:
             raise ValueError(f"生产环境缺少必要的环境变量: {', '.join(missing_vars)}")
 
+# 环境名称到配置类的映射，配置对象在首次使用时才创建
+db_config_by_name = {
+    'local': LocalDBConfig,
+    'docker': DockerDBConfig,
+    'production': ProductionDBConfig
+}
+
+# 已创建的配置对象缓存 {环境名称: 配置对象}
+_db_config_cache: Dict[str, BaseDBConfig] = {}
+
 # 使用延迟加载的方式获取配置对象
 def get_config_by_name(name):
     """根据环境名称获取相应的配置对象"""
-    config_classes = {
-        'local': LocalDBConfig,
-        'docker': DockerDBConfig,
-        'production': ProductionDBConfig
-    }
-    
-    config_class = config_classes.get(name, LocalDBConfig)
+    config_class = db_config_by_name.get(name, LocalDBConfig)
     try:
         return config_class()
     except ValueError as e:
@@ -70,5 +101,9 @@ def get_config_by_name(name):
 def get_db_config():
     """获取当前环境的数据库配置"""
     env = os.environ.get('FLASK_ENV', 'local')
-    print(f"当前环境: {env}")
-    return get_config_by_name(env) 
\ No newline at end of file
+    config = _db_config_cache.get(env)
+    if config is None:
+        print(f"当前环境: {env}")
+        config = get_config_by_name(env)
+        _db_config_cache[env] = config
+    return config 
\ No newline at end of file
@@ -1,9 +1,11 @@
 """
 数据库连接和会话管理模块
 """
+import os
 import logging
+import threading
 from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker, Session as _BaseSession
 from sqlalchemy.ext.declarative import declarative_base
 from .config import get_db_config
 from contextlib import contextmanager
@@ -11,22 +13,46 @@ from contextlib import contextmanager
 # 初始化日志
 logger = logging.getLogger(__name__)
 
-# 获取配置
-db_config = get_db_config()
+# 数据库引擎在首次使用时才创建，导入模块时不读取配置、不初始化连接池
+_engine = None
+_engine_lock = threading.Lock()
 
-# 创建引擎
-engine = create_engine(
-    db_config.SQLALCHEMY_DATABASE_URI,
-    pool_size=db_config.POOL_SIZE,
-    max_overflow=db_config.MAX_OVERFLOW,
-    pool_timeout=db_config.POOL_TIMEOUT,
-    pool_recycle=db_config.POOL_RECYCLE
-)
+def get_engine():
+    """获取数据库引擎，首次调用时根据当前环境配置创建"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                db_config = get_db_config()
+                _engine = create_engine(
+                    db_config.SQLALCHEMY_DATABASE_URI,
+                    pool_size=db_config.POOL_SIZE,
+                    max_overflow=db_config.MAX_OVERFLOW,
+                    pool_timeout=db_config.POOL_TIMEOUT,
+                    pool_recycle=db_config.POOL_RECYCLE,
+                    pool_pre_ping=db_config.POOL_PRE_PING,
+                    query_cache_size=db_config.QUERY_CACHE_SIZE
+                )
+    return _engine
+
+def _dispose_engine_after_fork():
+    """子进程中丢弃从父进程继承的连接（不关闭，避免影响父进程），之后按需重新建立连接"""
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engine_after_fork)
+
+class _LazyBindSession(_BaseSession):
+    """执行语句时才获取数据库引擎的会话"""
+    
+    def get_bind(self, mapper=None, **kwargs):
+        return get_engine()
 
 # 创建会话工厂
-Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Session = sessionmaker(class_=_LazyBindSession, autocommit=False, autoflush=False)
 
-# 创建线程安全的会话
+# 创建线程安全的会话，作用域为单个请求：同一请求内的各服务共用该会话，请求结束时由shutdown_session释放
 db_session = scoped_session(Session)
 
 # 创建基类
@@ -58,25 +84,27 @@ def get_db_session():
         session.close()
 
 def init_db():
-    """初始化数据库"""
+    """
+    初始化数据库
+
+    建表检查会对每张表发起一次查询，多个worker同时启动时会重复执行。
+    设置环境变量 DB_BOOTSTRAP=0 可跳过建表，只由部署/迁移步骤负责建表；默认仍执行建表。
+    """
+    if os.getenv('DB_BOOTSTRAP', '1') != '1':
+        logger.info("DB_BOOTSTRAP未开启，跳过数据库建表 (skipping schema create)")
+        return
+
     try:
-        # 导入所有模型以确保它们被注册
-        # 注意：导入顺序很重要，被引用的表需要先导入
-        from src.balance_system.models.user import User  # 先导入 User 模型
-        from src.balance_system.models.user_balance import UserBalance
-        from src.balance_system.models.transaction_record import TransactionRecord
-        from src.balance_system.models.api_usage import ApiUsage
-        from src.balance_system.models.pricing_rule import PricingRule
-        from src.balance_system.models.charge_package import ChargePackage
-        from src.balance_system.models.user_task import UserTask
-        
+        # 导入模型包以确保所有模型被注册（包内已按外键依赖顺序导入）
+        import src.balance_system.models  # noqa: F401
+
         # 创建所有表
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
         logger.info("数据库表创建成功")
     except Exception as e:
         logger.error(f"数据库初始化失败: {str(e)}")
         raise
 
 def shutdown_session(exception=None):
-    """关闭会话"""
+    """关闭当前请求的会话，并将连接归还连接池（注册为Flask的teardown_appcontext回调）"""
     db_session.remove() 
\ No newline at end of file
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from ..db import Base
 
 class ApiUsage(Base):
     """API使用记录模型"""
     __tablename__ = "api_usages"
+    __table_args__ = (
+        # 按用户查询使用记录并按时间排序
+        Index('ix_api_usages_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, comment="用户ID")
@@ -21,18 +25,31 @@ class ApiUsage(Base):
     # 关系
     user = relationship("User", back_populates="api_usages")
     
+    @classmethod
+    def dict_columns(cls):
+        """to_dict所需的列，列表查询时只查询这些列，无需构建ORM对象"""
+        return (
+            cls.id, cls.user_id, cls.transaction_id, cls.api_type, cls.model_size, cls.cost,
+            cls.input_size, cls.duration, cls.task_id, cls.details, cls.created_at
+        )
+    
+    @staticmethod
+    def row_to_dict(row):
+        """将ApiUsage对象或按dict_columns查询的结果行转换为字典"""
+        return {
+            "id": row.id,
+            "user_id": row.user_id,
+            "transaction_id": row.transaction_id,
+            "api_type": row.api_type,
+            "model_size": row.model_size,
+            "cost": float(row.cost),
+            "input_size": row.input_size,
+            "duration": row.duration,
+            "task_id": row.task_id,
+            "details": row.details,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+    
     def to_dict(self):
         """转换为字典"""
-        return {
-            "id": self.id,
-            "user_id": self.user_id,
-            "transaction_id": self.transaction_id,
-            "api_type": self.api_type,
-            "model_size": self.model_size,
-            "cost": float(self.cost),
-            "input_size": self.input_size,
-            "duration": self.duration,
-            "task_id": self.task_id,
-            "details": self.details,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        } 
\ No newline at end of file
+        return ApiUsage.row_to_dict(self)
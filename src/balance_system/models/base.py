@@ -1,11 +1,54 @@
+import os
+import json
+import time
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Text
+from sqlalchemy.types import TypeDecorator
 from ..db import Base
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 class TimestampMixin:
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+class JSONText(TypeDecorator):
+    """
+    以TEXT存储的JSON列
+
+    写入时序列化、加载行时解析一次，读取属性时得到的已是Python对象，无需在每次使用时重复解析。
+    空字符串视为None，兼容旧数据。
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if orjson is not None:
+            return orjson.dumps(value).decode('utf-8')
+        return json.dumps(value, ensure_ascii=False)
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return None
+        return orjson.loads(value) if orjson is not None else json.loads(value)
+
+def generate_uuid7():
+    """
+    生成按时间递增的UUID（UUIDv7格式：48位毫秒时间戳 + 随机数）
+    
+    新生成的ID总是排在索引末尾，避免随机UUID插入时造成B树页分裂
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    # 设置版本号(7)和变体(RFC 4122)
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return str(uuid.UUID(int=value))
+
 def generate_uuid():
-    return str(uuid.uuid4()) 
\ No newline at end of file
+    return generate_uuid7()
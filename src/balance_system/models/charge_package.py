@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Boolean
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Boolean, Index
 from ..db import Base
 
 class ChargePackage(Base):
     """充值套餐模型"""
     __tablename__ = "charge_packages"
+    __table_args__ = (
+        # 查询有效套餐并按排序字段排序
+        Index('ix_charge_pkg_active_sort', 'is_active', 'sort_order'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False, comment="套餐名称")
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Boolean
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Boolean, Index
 from ..db import Base
 
 class PricingRule(Base):
     """定价规则模型"""
     __tablename__ = "pricing_rules"
+    __table_args__ = (
+        # 按API类型、模型大小查询有效的定价规则
+        Index('ix_pricing_api_model_active', 'api_type', 'model_size', 'is_active'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     api_type = Column(String(50), index=True, nullable=False, comment="API类型")
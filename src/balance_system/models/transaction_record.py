@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, func, Enum, ForeignKey, Index
 import enum
 from sqlalchemy.orm import relationship
 from ..db import Base
@@ -15,6 +15,10 @@ class TransactionType(enum.Enum):
 class TransactionRecord(Base):
     """交易记录模型"""
     __tablename__ = "transaction_records"
+    __table_args__ = (
+        # 按用户查询交易记录并按时间倒序分页（InnoDB二级索引隐含主键id，可直接满足(created_at, id)排序和游标条件）
+        Index('ix_transaction_records_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, comment="用户ID")
@@ -23,6 +27,7 @@ class TransactionRecord(Base):
     transaction_type = Column(Enum(TransactionType), nullable=False, comment="交易类型")
     description = Column(String(200), nullable=True, comment="交易描述")
     operator = Column(String(50), nullable=True, comment="操作人")
+    # 创建时间只由数据库生成，与历史记录使用同一时钟和时区（MySQL为+08:00），保证按时间排序和游标翻页正确
     created_at = Column(DateTime, server_default=func.now(), nullable=False, comment="创建时间")
     expires_at = Column(DateTime, nullable=True, comment="过期时间")
     
@@ -30,16 +35,37 @@ class TransactionRecord(Base):
     api_usages = relationship("ApiUsage", backref="transaction_record")
     user_task = relationship("UserTask", backref="transaction_record")
 
-    def to_dict(self):
-        """转换为字典"""
+    @classmethod
+    def dict_columns(cls):
+        """to_dict所需的列，列表查询时只查询这些列，无需构建ORM对象"""
+        return (
+            cls.id, cls.user_id, cls.amount, cls.balance, cls.transaction_type,
+            cls.description, cls.operator, cls.created_at, cls.expires_at
+        )
+    
+    @staticmethod
+    def row_to_dict(row, include_created_at=True):
+        """将TransactionRecord对象或按dict_columns查询的结果行转换为字典
+        
+        include_created_at为False时created_at返回None，不读取该字段
+        """
+        created_at = row.created_at if include_created_at else None
         return {
-            "id": self.id,
-            "user_id": self.user_id,
-            "amount": float(self.amount),
-            "balance": float(self.balance),
-            "transaction_type": self.transaction_type.value,
-            "description": self.description,
-            "operator": self.operator,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
-        }
\ No newline at end of file
+            "id": row.id,
+            "user_id": row.user_id,
+            "amount": float(row.amount),
+            "balance": float(row.balance),
+            "transaction_type": row.transaction_type.value,
+            "description": row.description,
+            "operator": row.operator,
+            "created_at": created_at.isoformat() if created_at else None,
+            "expires_at": row.expires_at.isoformat() if row.expires_at else None,
+        }
+    
+    def to_dict(self):
+        """转换为字典
+        
+        created_at由数据库生成，记录刚flush（已有id）时尚未加载，此时返回None，不为此额外查询数据库
+        """
+        state = self.__dict__
+        return TransactionRecord.row_to_dict(self, include_created_at='created_at' in state or 'id' not in state)
@@ -1,5 +1,5 @@
 import bcrypt
-from sqlalchemy import Column, String, Numeric, Boolean, Text, DateTime, Integer, func
+from sqlalchemy import Column, String, Numeric, Boolean, Text, DateTime, Integer, func, CheckConstraint
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin, generate_uuid
 from decimal import Decimal
@@ -13,6 +13,10 @@ ROLE_SENIOR_AGENT = 3  # 高级代理
 
 class User(Base, TimestampMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        # 余额不允许为负，由数据库兜底保证扣减不会透支
+        CheckConstraint('balance >= 0', name='ck_users_balance_nonnegative'),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     username = Column(String(100), unique=True, nullable=False)
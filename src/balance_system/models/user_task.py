@@ -1,9 +1,19 @@
 import datetime
 
-from sqlalchemy import Column, String, Numeric, Boolean, Text, DateTime, Integer, func, TIMESTAMP, text, ForeignKey, \
+from sqlalchemy import Column, String, Numeric, Boolean, DateTime, Integer, func, TIMESTAMP, text, ForeignKey, \
     Float
 from ..db import Base
-import json
+from .base import JSONText
+
+# 任务状态码对应的状态名称，下标即状态码，其他状态码均视为失败
+_TASK_STATUS = ('uploaded', 'processing', 'analyzed', 'splitting', 'completed')
+
+# to_dict读取的列
+_DICT_COLUMNS = frozenset((
+    'task_no', 'source_file_name', 'source_file_path', 'user_id', 'status', 'source_file_size',
+    'source_file_duration_minutes', 'source_file_duration_seconds', 'transaction_id', 'audio_path',
+    'segments', 'output_files', 'output_dir', 'create_time', 'update_time'
+))
 
 class UserTask(Base):
     __tablename__ = 'user_tasks'
@@ -18,8 +28,8 @@ class UserTask(Base):
     source_file_duration_seconds = Column(Float, default=0, nullable=False)
     transaction_id = Column(Integer, ForeignKey('transaction_records.id'))
     audio_path = Column(String(255), default='', nullable=True)
-    segments = Column(Text, default='', nullable=True)
-    output_files = Column(Text, default='', nullable=True)
+    segments = Column(JSONText, nullable=True)
+    output_files = Column(JSONText, nullable=True)
     output_dir = Column(String(255), default='', nullable=True)
     create_time = Column(TIMESTAMP, server_default=func.now())
     update_time = Column(TIMESTAMP, server_default=func.now())
@@ -44,43 +54,41 @@ class UserTask(Base):
         #     'create_time': self.create_time if self.create_time else None,
         #     'update_time': self.update_time if self.update_time else None,
         # }
-        print("self.create_time.timestamp() is ", self.create_time.timestamp())
-
+        # 直接从实例__dict__读取列值，绕过SQLAlchemy属性描述符；对象已过期或有未加载的列时先通过属性访问加载
+        state = self.__dict__
+        if not _DICT_COLUMNS.issubset(state):
+            for name in _DICT_COLUMNS.difference(state):
+                getattr(self, name)
+        get = state.get
+        
+        create_time = get('create_time')
+        update_time = get('update_time')
         result = {
-            'id': self.task_no,
-            'filename': self.source_file_name,
-            'path': self.source_file_path,
-            'user_id': self.user_id,
-            'status': self.getTaskStatus(int(self.status)),
-            'size_mb': self.source_file_size,
-            'audio_duration_minutes': self.source_file_duration_minutes,
-            'audio_duration_seconds': self.source_file_duration_seconds,
-            'transaction_id': int(self.transaction_id),
-            'audio_path': self.audio_path,
-            'segments': json.loads(self.segments) if self.segments else None,
-            'output_files': json.loads(self.output_files) if self.output_files else None,
-            'output_dir': self.output_dir,
-            'create_time': self.create_time if self.create_time else None,
-            'created_at': self.create_time.timestamp() if self.create_time else None,
-            'update_time': self.update_time.timestamp() if self.update_time else None,
+            'id': get('task_no'),
+            'filename': get('source_file_name'),
+            'path': get('source_file_path'),
+            'user_id': get('user_id'),
+            'status': self.getTaskStatus(int(get('status'))),
+            'size_mb': get('source_file_size'),
+            'audio_duration_minutes': get('source_file_duration_minutes'),
+            'audio_duration_seconds': get('source_file_duration_seconds'),
+            'transaction_id': int(get('transaction_id')),
+            'audio_path': get('audio_path'),
+            'output_files': get('output_files'),
+            'output_dir': get('output_dir'),
+            'create_time': create_time if create_time else None,
+            'created_at': create_time.timestamp() if create_time else None,
+            'update_time': update_time.timestamp() if update_time else None,
+            # 与内存任务信息保持一致，分段只放在transcription下
+            'transcription': {'segments': get('segments')},
         }
-
-        result['transcription'] = {'segments': result['segments']}
         return result
 
-    def getTaskStatus(self, status: int):
-        if (status == 0):
-            return 'uploaded'
-        elif (status == 1):
-            return 'processing'
-        elif (status == 2):
-            return 'analyzed'
-        elif (status == 3):
-            return 'splitting'
-        elif (status == 4):
-            return 'completed'
-        else:
-            return 'failed'
+    @staticmethod
+    def getTaskStatus(status: int):
+        if 0 <= status < len(_TASK_STATUS):
+            return _TASK_STATUS[status]
+        return 'failed'
 
 # task_info = {
 #     "id": task_id,
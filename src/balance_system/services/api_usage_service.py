@@ -1,15 +1,26 @@
 import logging
 from typing import Dict, Any, Optional, List
-from decimal import Decimal
+from sqlalchemy import select, tuple_, func
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..db import db_session
+from ..cache import invalidate_balance
 from ..models.api_usage import ApiUsage
-from .balance_service import BalanceService
+from .. import usage_writer
+from .balance_service import BalanceService, to_decimal
 from .pricing_service import PricingService
 
 logger = logging.getLogger(__name__)
 
+# ApiUsage.details列的最大长度
+_DETAILS_MAX_LENGTH = ApiUsage.__table__.c.details.type.length
+
+def _truncate_details(details: Optional[str]) -> Optional[str]:
+    """截断超出列长度的详情，避免严格模式下写入失败"""
+    if details is not None and len(details) > _DETAILS_MAX_LENGTH:
+        return details[:_DETAILS_MAX_LENGTH]
+    return details
+
 class ApiUsageService:
     @staticmethod
     def record_api_usage(
@@ -22,36 +33,46 @@ class ApiUsageService:
         details: Optional[str] = None
     ) -> Dict[str, Any]:
         """记录API使用并扣除余额"""
-        # 扣除余额
+        # 金额只转换一次，扣费和使用记录共用
+        decimal_cost = to_decimal(cost)
+        
+        # 扣除余额（暂不提交，与使用记录在同一事务中提交）
         try:
             consume_result = BalanceService.consume_user_balance(
                 user_id=user_id,
-                amount=cost,
-                description=f"use {api_type} service"
+                amount=decimal_cost,
+                description=f"use {api_type} service",
+                commit=False
             )
         except ValueError as e:
             logger.error(f"扣除余额失败: {e}")
             raise
         
-        # 记录API使用
+        # 记录API使用（使用Core insert，不经过ORM的对象状态跟踪）
+        # 创建时间与异步写入路径和历史记录一样由数据库生成，保证同一时钟和时区；返回结果中不再为此额外查询
+        values = {
+            "user_id": user_id,
+            "transaction_id": consume_result["transaction"]["id"],
+            "api_type": api_type,
+            "model_size": "",
+            "cost": decimal_cost,
+            "input_size": input_size,
+            "duration": duration,
+            "task_id": task_id,
+            "details": _truncate_details(details)
+        }
         db = db_session()
         try:
-            api_usage = ApiUsage(
-                user_id=user_id,
-                api_type=api_type,
-                model_size="",
-                cost=Decimal(str(cost)),
-                input_size=input_size,
-                duration=duration,
-                task_id=task_id,
-                details=details
-            )
-            db.add(api_usage)
+            result = db.execute(ApiUsage.__table__.insert().values(**values))
+            usage_id = result.inserted_primary_key[0]
+            # 扣费、交易记录和使用记录一次提交
             db.commit()
-            db.refresh(api_usage)
+            invalidate_balance(user_id)
+            
+            usage = ApiUsage(id=usage_id, **values)
             
             return {
-                "usage": api_usage.to_dict(),
+                "usage": usage.to_dict(),
                 "balance": consume_result["balance"],
                 "transaction": consume_result["transaction"]
             }
@@ -62,14 +83,61 @@ class ApiUsageService:
         finally:
             db.close()
     
+    @staticmethod
+    def enqueue_api_usage(
+        user_id: str,
+        api_type: str,
+        task_id: str,
+        cost: Optional[float] = None,
+        input_size: Optional[float] = None,
+        duration: Optional[float] = None,
+        details: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """扣除余额并提交API使用记录，记录由后台线程批量写入，适用于不需要返回使用记录的调用方"""
+        # 金额只转换一次，扣费和使用记录共用
+        decimal_cost = to_decimal(cost)
+        
+        # 扣除余额（同步执行，保证余额检查的正确性）
+        try:
+            consume_result = BalanceService.consume_user_balance(
+                user_id=user_id,
+                amount=decimal_cost,
+                description=f"use {api_type} service"
+            )
+        except ValueError as e:
+            logger.error(f"扣除余额失败: {e}")
+            raise
+        
+        usage_writer.enqueue({
+            "user_id": user_id,
+            "transaction_id": consume_result["transaction"]["id"],
+            "api_type": api_type,
+            "model_size": "",
+            "cost": decimal_cost,
+            "input_size": input_size,
+            "duration": duration,
+            "task_id": task_id,
+            "details": _truncate_details(details)
+        })
+        
+        return {
+            "balance": consume_result["balance"],
+            "transaction": consume_result["transaction"]
+        }
+    
     @staticmethod
     def get_user_api_usage(
         user_id: str, 
         page: int = 1, 
         per_page: int = 20, 
-        api_type: Optional[str] = None
+        api_type: Optional[str] = None,
+        after_id: Optional[int] = None
     ) -> Dict[str, Any]:
-        """获取用户API使用记录"""
+        """获取用户API使用记录
+        
+        传入after_id（上一页最后一条记录的id）时按游标翻页，不再使用OFFSET扫描并丢弃前面的记录，
+        此时忽略page参数。返回结果中的next_cursor可作为下一页的after_id。
+        """
         if page < 1:
             page = 1
         if per_page < 1:
@@ -83,19 +151,41 @@ class ApiUsageService:
             if api_type:
                 query = query.filter(ApiUsage.api_type == api_type)
             
-            # 查询总数
-            total = query.count()
+            # 分页查询（只查询所需的列，直接由结果行生成字典）
+            base_query = query
+            if after_id is not None:
+                # 游标翻页：取排在游标记录之后的记录，游标条件会影响窗口计数，总数单独查询
+                total = base_query.count()
+                cursor_time = select(ApiUsage.created_at).where(
+                    ApiUsage.id == after_id
+                ).scalar_subquery()
+                query = base_query.with_entities(*ApiUsage.dict_columns()).filter(
+                    tuple_(ApiUsage.created_at, ApiUsage.id) < tuple_(cursor_time, after_id)
+                )
+            else:
+                # 总数通过窗口函数随分页结果一并返回，省去单独的COUNT查询
+                query = base_query.with_entities(
+                    *ApiUsage.dict_columns(), func.count().over().label("_total")
+                )
             
-            # 分页查询
-            usages = query.order_by(
-                ApiUsage.created_at.desc()
-            ).offset((page - 1) * per_page).limit(per_page).all()
+            query = query.order_by(
+                ApiUsage.created_at.desc(),
+                ApiUsage.id.desc()
+            )
+            if after_id is None:
+                query = query.offset((page - 1) * per_page)
+            rows = query.limit(per_page).all()
+            
+            if after_id is None:
+                # 页码超出范围时结果为空，拿不到窗口计数，回退为单独查询总数
+                total = rows[0]._total if rows else (base_query.count() if page > 1 else 0)
             
             return {
                 "total": total,
                 "page": page,
                 "per_page": per_page,
-                "items": [u.to_dict() for u in usages]
+                "items": [ApiUsage.row_to_dict(row) for row in rows],
+                "next_cursor": rows[-1].id if len(rows) == per_page else None
             }
         except SQLAlchemyError as e:
             logger.error(f"查询API使用记录失败: {e}")
@@ -108,48 +198,49 @@ class ApiUsageService:
         """获取用户API使用统计"""
         db = db_session()
         try:
-            # 总消费金额
-            total_cost = db.query(ApiUsage).filter(
+            # 按API类型和模型大小分组汇总消费金额和次数
+            grouped = db.query(ApiUsage).filter(
                 ApiUsage.user_id == user_id
             ).with_entities(
                 ApiUsage.api_type,
                 ApiUsage.model_size,
-                db.func.sum(ApiUsage.cost).label("total_cost"),
-                db.func.count(ApiUsage.id).label("count")
+                func.sum(ApiUsage.cost).label("total_cost"),
+                func.count(ApiUsage.id).label("count")
             ).group_by(
                 ApiUsage.api_type,
                 ApiUsage.model_size
             ).all()
             
-            # 按API类型汇总
+            # 分组结果只需组装成嵌套结构，总计在同一次遍历中累加
             api_type_stats = {}
-            for stat in total_cost:
-                api_type = stat.api_type
-                if api_type not in api_type_stats:
-                    api_type_stats[api_type] = {
+            total_cost = 0.0
+            total_count = 0
+            for api_type, model_size, cost, count in grouped:
+                cost = float(cost)
+                total_cost += cost
+                total_count += count
+                
+                type_stats = api_type_stats.get(api_type)
+                if type_stats is None:
+                    type_stats = api_type_stats[api_type] = {
                         "total_cost": 0,
                         "count": 0,
                         "models": {}
                     }
+                type_stats["total_cost"] += cost
+                type_stats["count"] += count
                 
-                # 总计
-                api_type_stats[api_type]["total_cost"] += float(stat.total_cost)
-                api_type_stats[api_type]["count"] += stat.count
-                
-                # 按模型汇总
-                model_size = stat.model_size or "default"
-                if model_size not in api_type_stats[api_type]["models"]:
-                    api_type_stats[api_type]["models"][model_size] = {
-                        "total_cost": 0,
-                        "count": 0
-                    }
-                
-                api_type_stats[api_type]["models"][model_size]["total_cost"] += float(stat.total_cost)
-                api_type_stats[api_type]["models"][model_size]["count"] += stat.count
+                # 按模型汇总（model_size为空时归入default，可能由多个分组合并）
+                model_stats = type_stats["models"].setdefault(model_size or "default", {
+                    "total_cost": 0,
+                    "count": 0
+                })
+                model_stats["total_cost"] += cost
+                model_stats["count"] += count
             
             return {
-                "total_cost": sum(stats["total_cost"] for stats in api_type_stats.values()),
-                "total_count": sum(stats["count"] for stats in api_type_stats.values()),
+                "total_cost": total_cost,
+                "total_count": total_count,
                 "api_types": api_type_stats
             }
         except SQLAlchemyError as e:
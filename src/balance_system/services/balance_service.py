@@ -1,16 +1,30 @@
 from decimal import Decimal
 import logging
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Union
+from sqlalchemy import update, select, tuple_, func, lambda_stmt
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
 
 from ..db import db_session
+from ..cache import get_cached_balance, set_cached_balance, invalidate_balance
 from ..models.user import User
 from ..models.transaction_record import TransactionRecord, TransactionType
 from ..models.user_balance import UserBalance
 
 logger = logging.getLogger(__name__)
 
+def to_decimal(value: Union[Decimal, int, float, str]) -> Decimal:
+    """将金额转换为Decimal
+    
+    Decimal直接返回，整数和字符串直接构造；只有浮点数需要先转为字符串，
+    避免Decimal(float)带入二进制误差。
+    """
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(str(value))
+    return Decimal(value)
+
 class BalanceService:
     @staticmethod
     def record_register_balance(user_id: str, points: int = 50) -> Dict[str, Any]:
@@ -31,7 +45,7 @@ class BalanceService:
             
             # 设置点数过期时间（30天后）
             expires_at = datetime.utcnow() + timedelta(days=30)
-            decimal_points = Decimal(str(points))
+            decimal_points = to_decimal(points)
             
             # 更新用户余额 (User表)
             user.balance += decimal_points
@@ -64,13 +78,13 @@ class BalanceService:
             )
             
             db_session.add(transaction)
+            # 提交前生成返回数据，提交后对象会过期，再访问属性需要重新查询
+            db_session.flush()
+            result = transaction.to_dict()
             db_session.commit()
-            db_session.refresh(transaction)
-            db_session.refresh(user)  # 刷新用户对象
-            if balance_record in db_session:
-                db_session.refresh(balance_record)  # 刷新余额记录
+            invalidate_balance(user_id)
             
-            return transaction.to_dict()
+            return result
         except SQLAlchemyError as e:
             db_session.rollback()
             logger.error(f"记录注册赠送点数失败: {e}")
@@ -79,24 +93,120 @@ class BalanceService:
     @staticmethod
     def get_user_balance(user_id: str) -> Dict[str, Any]:
         """获取用户余额信息"""
+        cached = get_cached_balance(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            user = db_session.query(User).filter(User.id == user_id).first()
+            # lambda_stmt按lambda代码位置缓存语句结构，每次调用只替换user_id参数，省去构建查询和生成缓存键的开销
+            user = db_session.execute(lambda_stmt(
+                lambda: select(User.balance, User.total_charged, User.total_consumed).where(User.id == user_id)
+            )).first()
             if not user:
                 raise ValueError("用户不存在")
             
-            return {
+            balance_info = {
                 "balance": float(user.balance),
                 "total_charged": float(user.total_charged),
                 "total_consumed": float(user.total_consumed)
             }
+            set_cached_balance(user_id, balance_info)
+            return balance_info
         except SQLAlchemyError as e:
             logger.error(f"查询用户余额失败: {e}")
             raise
     
+    @staticmethod
+    def check_balance(
+        user_id: str,
+        file_size_mb: float,
+        audio_duration_minutes: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """检查用户余额是否足够支付预估费用
+        
+        余额通过get_user_balance读取（命中缓存时不访问数据库），费用按内存中的定价规则计算，
+        整个检查最多只有一次数据库往返。
+        """
+        from .pricing_service import PricingService
+        
+        balance = BalanceService.get_user_balance(user_id)["balance"]
+        cost_info = PricingService.estimate_cost(
+            file_size_mb=file_size_mb,
+            audio_duration_minutes=audio_duration_minutes
+        )
+        required_balance = cost_info["estimated_cost"]
+        
+        return {
+            "balance": balance,
+            "required_balance": required_balance,
+            "is_sufficient": balance >= required_balance,
+            "details": cost_info["details"]
+        }
+    
+    @staticmethod
+    def _apply_balance_change(
+        user_id: str,
+        balance_delta: Decimal,
+        charged_delta: Decimal = Decimal('0'),
+        consumed_delta: Decimal = Decimal('0'),
+        require_sufficient: bool = False
+    ) -> Optional[Tuple[Decimal, Decimal, Decimal]]:
+        """以原子UPDATE修改用户余额，并同步UserBalance表
+        
+        require_sufficient为True时余额检查并入UPDATE条件，余额不足则不更新任何行。
+        
+        Returns:
+            更新后的(余额, 总充值, 总消费)；用户不存在或余额不足时返回None
+        """
+        condition = [User.id == user_id]
+        if require_sufficient:
+            condition.append(User.balance >= -balance_delta)
+        
+        result = db_session.execute(
+            update(User)
+            .where(*condition)
+            .values(
+                balance=User.balance + balance_delta,
+                total_charged=User.total_charged + charged_delta,
+                total_consumed=User.total_consumed + consumed_delta
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            return None
+        
+        # 同时更新UserBalance表中的余额
+        result = db_session.execute(
+            update(UserBalance)
+            .where(UserBalance.user_id == user_id)
+            .values(
+                balance=UserBalance.balance + balance_delta,
+                total_charged=UserBalance.total_charged + charged_delta,
+                total_consumed=UserBalance.total_consumed + consumed_delta
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        # 读取更新后的余额（该行已被本事务的UPDATE锁定）
+        totals = db_session.execute(lambda_stmt(
+            lambda: select(User.balance, User.total_charged, User.total_consumed).where(User.id == user_id)
+        )).one()
+        
+        if result.rowcount == 0:
+            # 如果不存在，则创建新记录（通常不会发生，因为User创建时应该也创建了UserBalance）
+            db_session.add(UserBalance(
+                user_id=user_id,
+                balance=totals.balance,
+                total_charged=totals.total_charged,
+                total_consumed=totals.total_consumed
+            ))
+        
+        return tuple(totals)
+    
     @staticmethod
     def charge_user_balance(
         user_id: str, 
-        amount: float, 
+        amount: Union[Decimal, float], 
         description: Optional[str] = None,
         operator: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -105,50 +215,38 @@ class BalanceService:
             raise ValueError("充值金额必须大于0")
         
         try:
-            user = db_session.query(User).filter(User.id == user_id).first()
-            if not user:
-                raise ValueError("用户不存在")
-            
-            # 更新User表中的余额
-            decimal_amount = Decimal(str(amount))
-            user.balance += decimal_amount
-            user.total_charged += decimal_amount
+            decimal_amount = to_decimal(amount)
             
-            # 同时更新UserBalance表中的余额
-            balance_record = db_session.query(UserBalance).filter(UserBalance.user_id == user_id).first()
-            if balance_record:
-                balance_record.balance += decimal_amount
-                balance_record.total_charged += decimal_amount
-            else:
-                # 如果不存在，则创建新记录
-                balance_record = UserBalance(
-                    user_id=user_id,
-                    balance=user.balance,
-                    total_charged=user.total_charged,
-                    total_consumed=user.total_consumed
-                )
-                db_session.add(balance_record)
+            # 以一条UPDATE累加余额，不再先查询用户再在Python中修改
+            totals = BalanceService._apply_balance_change(
+                user_id, decimal_amount, charged_delta=decimal_amount
+            )
+            if totals is None:
+                raise ValueError("用户不存在")
+            balance, total_charged, total_consumed = totals
             
             # 创建交易记录
             transaction = TransactionRecord(
                 user_id=user_id,
                 amount=decimal_amount,
-                balance=user.balance,
+                balance=balance,
                 transaction_type=TransactionType.CHARGE,
                 description=description,
                 operator=operator
             )
             
             db_session.add(transaction)
+            # 提交前生成返回数据，提交后对象会过期，再访问属性需要重新查询
+            db_session.flush()
+            transaction_dict = transaction.to_dict()
             db_session.commit()
-            db_session.refresh(user)
-            db_session.refresh(transaction)
+            invalidate_balance(user_id)
             
             return {
-                "balance": float(user.balance),
-                "total_charged": float(user.total_charged),
-                "total_consumed": float(user.total_consumed),
-                "transaction": transaction.to_dict()
+                "balance": float(balance),
+                "total_charged": float(total_charged),
+                "total_consumed": float(total_consumed),
+                "transaction": transaction_dict
             }
         except SQLAlchemyError as e:
             db_session.rollback()
@@ -158,62 +256,51 @@ class BalanceService:
     @staticmethod
     def consume_user_balance(
         user_id: str, 
-        amount: float, 
-        description: Optional[str] = None
+        amount: Union[Decimal, float], 
+        description: Optional[str] = None,
+        commit: bool = True
     ) -> Dict[str, Any]:
-        """用户消费"""
+        """用户消费
+        
+        commit为False时不提交事务，由调用方与其他写入一并提交，并在提交后调用invalidate_balance。
+        """
         if amount <= 0:
             raise ValueError("消费金额必须大于0")
         
         try:
-            user = db_session.query(User).filter(User.id == user_id).first()
-            if not user:
-                raise ValueError("用户不存在")
-            
-            decimal_amount = Decimal(str(amount))
-            
-            # 检查余额是否足够
-            if user.balance < decimal_amount:
-                raise ValueError("余额不足")
-            
-            # 更新User表中的余额
-            user.balance -= decimal_amount
-            user.total_consumed += decimal_amount
+            decimal_amount = to_decimal(amount)
             
-            # 同时更新UserBalance表中的余额
-            balance_record = db_session.query(UserBalance).filter(UserBalance.user_id == user_id).first()
-            if balance_record:
-                balance_record.balance -= decimal_amount
-                balance_record.total_consumed += decimal_amount
-            else:
-                # 如果不存在，则创建新记录（通常不会发生，因为User创建时应该也创建了UserBalance）
-                balance_record = UserBalance(
-                    user_id=user_id,
-                    balance=user.balance,
-                    total_charged=user.total_charged,
-                    total_consumed=user.total_consumed
-                )
-                db_session.add(balance_record)
+            # 余额检查与扣减合并为一条原子UPDATE，余额不足时不更新任何行，无需先查询再加锁
+            totals = BalanceService._apply_balance_change(
+                user_id, -decimal_amount, consumed_delta=decimal_amount, require_sufficient=True
+            )
+            if totals is None:
+                exists = db_session.query(User.id).filter(User.id == user_id).first()
+                raise ValueError("余额不足" if exists else "用户不存在")
+            balance, total_charged, total_consumed = totals
             
             # 创建交易记录
             transaction = TransactionRecord(
                 user_id=user_id,
                 amount=-decimal_amount,  # 消费为负数
-                balance=user.balance,
+                balance=balance,
                 transaction_type=TransactionType.CONSUME,
                 description=description
             )
             
             db_session.add(transaction)
-            db_session.commit()
-            db_session.refresh(user)
-            db_session.refresh(transaction)
+            # 提交前生成返回数据，提交后对象会过期，再访问属性需要重新查询
+            db_session.flush()
+            transaction_dict = transaction.to_dict()
+            if commit:
+                db_session.commit()
+                invalidate_balance(user_id)
             
             return {
-                "balance": float(user.balance),
-                "total_charged": float(user.total_charged),
-                "total_consumed": float(user.total_consumed),
-                "transaction": transaction.to_dict()
+                "balance": float(balance),
+                "total_charged": float(total_charged),
+                "total_consumed": float(total_consumed),
+                "transaction": transaction_dict
             }
         except SQLAlchemyError as e:
             db_session.rollback()
@@ -221,27 +308,55 @@ class BalanceService:
             raise
     
     @staticmethod
-    def get_user_transactions(user_id: str, page: int = 1, per_page: int = 20) -> Tuple[List[Dict[str, Any]], int]:
-        """获取用户交易记录"""
+    def get_user_transactions(
+        user_id: str, 
+        page: int = 1, 
+        per_page: int = 20, 
+        after_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """获取用户交易记录
+        
+        传入after_id（上一页最后一条记录的id）时按游标翻页，不再使用OFFSET扫描并丢弃前面的记录，
+        此时忽略page参数。
+        """
         if page < 1:
             page = 1
         if per_page < 1:
             per_page = 20
         
         try:
-            # 查询总数
-            total = db_session.query(TransactionRecord).filter(
+            # 分页查询（只查询所需的列，直接由结果行生成字典）
+            base_query = db_session.query(TransactionRecord).filter(
                 TransactionRecord.user_id == user_id
-            ).count()
+            )
+            if after_id is not None:
+                # 游标翻页：取排在游标记录之后的记录，游标条件会影响窗口计数，总数单独查询
+                total = base_query.count()
+                cursor_time = select(TransactionRecord.created_at).where(
+                    TransactionRecord.id == after_id
+                ).scalar_subquery()
+                query = base_query.with_entities(*TransactionRecord.dict_columns()).filter(
+                    tuple_(TransactionRecord.created_at, TransactionRecord.id) < tuple_(cursor_time, after_id)
+                )
+            else:
+                # 总数通过窗口函数随分页结果一并返回，省去单独的COUNT查询
+                query = base_query.with_entities(
+                    *TransactionRecord.dict_columns(), func.count().over().label("_total")
+                )
             
-            # 分页查询
-            transactions = db_session.query(TransactionRecord).filter(
-                TransactionRecord.user_id == user_id
-            ).order_by(
-                TransactionRecord.created_at.desc()
-            ).offset((page - 1) * per_page).limit(per_page).all()
+            query = query.order_by(
+                TransactionRecord.created_at.desc(),
+                TransactionRecord.id.desc()
+            )
+            if after_id is None:
+                query = query.offset((page - 1) * per_page)
+            rows = query.limit(per_page).all()
+            
+            if after_id is None:
+                # 页码超出范围时结果为空，拿不到窗口计数，回退为单独查询总数
+                total = rows[0]._total if rows else (base_query.count() if page > 1 else 0)
             
-            return [t.to_dict() for t in transactions], total
+            return [TransactionRecord.row_to_dict(row) for row in rows], total
         except SQLAlchemyError as e:
             logger.error(f"查询用户交易记录失败: {e}")
             raise
@@ -250,47 +365,61 @@ class BalanceService:
     def check_expired_balance(user_id: str) -> None:
         """检查并处理过期点数"""
         try:
-            # 查找已过期但未标记为过期的点数记录
+            # 查找已过期但未标记为过期的点数记录，在数据库中直接统计条数和正数点数之和
             now = datetime.utcnow()
-            expired_transactions = db_session.query(TransactionRecord).filter(
+            expired_filter = (
                 TransactionRecord.user_id == user_id,
                 TransactionRecord.expires_at < now,
                 TransactionRecord.transaction_type.in_([TransactionType.REGISTER, TransactionType.GIFT])
-            ).all()
-            
-            if not expired_transactions:
+            )
+            expired_count = select(func.count(TransactionRecord.id)).where(
+                *expired_filter
+            ).scalar_subquery()
+            expired_total = select(func.coalesce(func.sum(TransactionRecord.amount), 0)).where(
+                *expired_filter, TransactionRecord.amount > 0
+            ).scalar_subquery()
+            
+            # 与用户当前点数一并查询，并锁定用户行，保证下面的扣减基于最新余额
+            row = db_session.query(
+                User.balance, expired_count, expired_total
+            ).filter(User.id == user_id).with_for_update(of=User).first()
+            
+            if not row:
                 return
+            current_balance, count, total_expired = row
             
-            # 更新用户点数
-            user = db_session.query(User).filter(User.id == user_id).first()
-            if not user:
+            if not count:
+                db_session.rollback()
                 return
             
-            # 计算要扣除的点数
-            total_expired = sum(float(t.amount) for t in expired_transactions if float(t.amount) > 0)
+            # 确保不会出现负数点数
+            deduct_points = min(current_balance, Decimal(total_expired))
             
-            if total_expired > 0:
-                # 确保不会出现负数点数
-                current_balance = float(user.balance)
-                deduct_points = min(current_balance, total_expired)
+            if deduct_points > 0:
+                # 更新用户点数
+                db_session.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(balance=User.balance - deduct_points)
+                    .execution_options(synchronize_session=False)
+                )
+                
+                # 创建过期记录
+                transaction = TransactionRecord(
+                    user_id=user_id,
+                    amount=-deduct_points,
+                    balance=current_balance - deduct_points,
+                    transaction_type=TransactionType.CONSUME,
+                    description=f"Points expired {count} records）"
+                )
+                
+                db_session.add(transaction)
+                db_session.commit()
+                invalidate_balance(user_id)
                 
-                if deduct_points > 0:
-                    # 更新用户余额
-                    user.balance -= Decimal(str(deduct_points))
-                    
-                    # 创建过期记录
-                    transaction = TransactionRecord(
-                        user_id=user_id,
-                        amount=-Decimal(str(deduct_points)),
-                        balance=user.balance,
-                        transaction_type=TransactionType.CONSUME,
-                        description=f"Points expired {len(expired_transactions)} records）"
-                    )
-                    
-                    db_session.add(transaction)
-                    db_session.commit()
-                    
-                    logger.info(f"用户 {user_id} 的 {deduct_points} 点数已过期")
+                logger.info(f"用户 {user_id} 的 {deduct_points} 点数已过期")
+            else:
+                db_session.rollback()
         
         except SQLAlchemyError as e:
             db_session.rollback()
@@ -314,56 +443,42 @@ class BalanceService:
             raise ValueError("充值金额必须大于0")
         
         try:
-            # 获取代理用户
-            agent = db_session.query(User).filter(User.id == agent_id).first()
+            decimal_amount = to_decimal(amount)
+            
+            # 交易描述需要代理和用户的名称，一次查询取回
+            names = {
+                row.id: row for row in db_session.query(User.id, User.username, User.email).filter(
+                    User.id.in_((agent_id, user_id))
+                )
+            }
+            agent = names.get(agent_id)
             if not agent:
                 raise ValueError("代理用户不存在")
-            
-            # 获取普通用户
-            user = db_session.query(User).filter(User.id == user_id).first()
+            user = names.get(user_id)
             if not user:
                 raise ValueError("普通用户不存在")
             
-            # 检查代理余额是否足够
-            decimal_amount = Decimal(str(amount))
-            if agent.balance < decimal_amount:
+            # 1. 处理代理用户余额 - 扣除（余额检查并入UPDATE条件，并发划扣不会透支）
+            agent_totals = BalanceService._apply_balance_change(
+                agent_id, -decimal_amount, consumed_delta=decimal_amount, require_sufficient=True
+            )
+            if agent_totals is None:
                 raise ValueError("代理余额不足")
             
-            # 1. 处理代理用户余额 - 扣除
-            agent.balance -= decimal_amount
-            agent.total_consumed += decimal_amount
-            
-            # 同时更新代理用户的UserBalance表
-            agent_balance = db_session.query(UserBalance).filter(UserBalance.user_id == agent_id).first()
-            if agent_balance:
-                agent_balance.balance -= decimal_amount
-                agent_balance.total_consumed += decimal_amount
-            
             # 2. 处理普通用户余额 - 增加
-            user.balance += decimal_amount
-            user.total_charged += decimal_amount
-            
-            # 同时更新普通用户的UserBalance表
-            user_balance = db_session.query(UserBalance).filter(UserBalance.user_id == user_id).first()
-            if user_balance:
-                user_balance.balance += decimal_amount
-                user_balance.total_charged += decimal_amount
-            else:
-                # 如果不存在，则创建新记录
-                user_balance = UserBalance(
-                    user_id=user_id,
-                    balance=user.balance,
-                    total_charged=user.total_charged,
-                    total_consumed=user.total_consumed
-                )
-                db_session.add(user_balance)
+            user_totals = BalanceService._apply_balance_change(
+                user_id, decimal_amount, charged_delta=decimal_amount
+            )
+            if user_totals is None:
+                db_session.rollback()
+                raise ValueError("普通用户不存在")
             
             # 为代理用户创建消费交易记录
             agent_description = description or f"给用户 {user.username} ({user.email}) 充值 {amount} 点"
             agent_transaction = TransactionRecord(
                 user_id=agent_id,
                 amount=-decimal_amount,  # 消费为负数
-                balance=agent.balance,
+                balance=agent_totals[0],
                 transaction_type=TransactionType.AGENT_CONSUME,
                 description=agent_description,
                 operator=agent.username
@@ -374,7 +489,7 @@ class BalanceService:
             user_transaction = TransactionRecord(
                 user_id=user_id,
                 amount=decimal_amount,
-                balance=user.balance,
+                balance=user_totals[0],
                 transaction_type=TransactionType.AGENT_CHARGE,
                 description=user_description,
                 operator=agent.username
@@ -382,18 +497,16 @@ class BalanceService:
             
             db_session.add(agent_transaction)
             db_session.add(user_transaction)
-            db_session.commit()
-            
-            # 刷新数据
-            db_session.refresh(agent)
-            db_session.refresh(user)
-            db_session.refresh(agent_transaction)
-            db_session.refresh(user_transaction)
-            
-            return (
+            # 提交前生成返回数据，提交后对象会过期，再访问属性需要重新查询
+            db_session.flush()
+            result = (
                 agent_transaction.to_dict(),
                 user_transaction.to_dict()
             )
+            db_session.commit()
+            invalidate_balance(agent_id, user_id)
+            
+            return result
         except SQLAlchemyError as e:
             db_session.rollback()
             logger.error(f"代理充值失败: {e}")
@@ -1,14 +1,150 @@
-from decimal import Decimal
+from decimal import InvalidOperation
 import logging
-from typing import List, Dict, Any, Optional, Union
+import time
+import threading
+from itertools import chain
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Union, Tuple
+from sqlalchemy import event, select
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
-from ..db import db_session
+from ..db import db_session, get_db_session
+from .balance_service import to_decimal
 from ..models.pricing_rule import PricingRule
 from ..models.charge_package import ChargePackage
 
 logger = logging.getLogger(__name__)
 
+# 定价规则缓存的有效期（秒），其他进程修改规则后最多延迟该时间生效
+PRICING_CACHE_TTL = 60
+
+# 定价规则索引缓存 (ttl_bucket, 索引)，首次加载和过期后的重新加载由锁保证只查询一次
+_rule_index_cache: Optional[Tuple[int, Dict[Tuple[str, Optional[str]], Tuple[int, float, Optional[float], Optional[float]]]]] = None
+# 缓存失效的次数，加载期间发生失效时不保存加载结果，避免缓存旧规则
+_rule_index_generation = 0
+_rule_index_lock = threading.Lock()
+
+def _query_rule_index() -> Dict[Tuple[str, Optional[str]], Tuple[int, float, Optional[float], Optional[float]]]:
+    """
+    一次查询取出全部有效的定价规则，按 (API类型, 模型大小) 建立索引
+    
+    Returns:
+        {(API类型, 模型大小): (规则ID, 基础价格, 每分钟价格, 每MB价格)}，默认规则的模型大小为None
+    """
+    # 使用独立的会话，不影响当前请求的会话（关闭请求会话会丢弃调用方尚未提交的修改）
+    with get_db_session() as db:
+        # 定价规则数量很少，直接使用Core语句取出所需的列，不经过ORM实体加载
+        rows = db.execute(
+            select(
+                PricingRule.id,
+                PricingRule.api_type,
+                PricingRule.model_size,
+                PricingRule.base_price,
+                PricingRule.price_per_minute,
+                PricingRule.price_per_mb
+            ).where(PricingRule.is_active == True).order_by(PricingRule.id)
+        ).all()
+    
+    index = {}
+    for rule in rows:
+        # 同一 (API类型, 模型大小) 存在多条有效规则时，使用最早创建的一条
+        index.setdefault((rule.api_type, rule.model_size), (
+            rule.id,
+            float(rule.base_price),
+            float(rule.price_per_minute) if rule.price_per_minute else None,
+            float(rule.price_per_mb) if rule.price_per_mb else None
+        ))
+    return index
+
+def _get_rule_index() -> Dict[Tuple[str, Optional[str]], Tuple[int, float, Optional[float], Optional[float]]]:
+    """获取定价规则索引，超过PRICING_CACHE_TTL或缓存失效后重新加载"""
+    global _rule_index_cache
+    ttl_bucket = int(time.monotonic() // PRICING_CACHE_TTL)
+    cached = _rule_index_cache
+    if cached is not None and cached[0] == ttl_bucket:
+        return cached[1]
+    
+    # 缓存未命中时加锁，并发的线程等待第一个线程加载完成后直接使用其结果
+    with _rule_index_lock:
+        cached = _rule_index_cache
+        if cached is not None and cached[0] == ttl_bucket:
+            return cached[1]
+        generation = _rule_index_generation
+        index = _query_rule_index()
+        if generation == _rule_index_generation:
+            _rule_index_cache = (ttl_bucket, index)
+        return index
+
+def _load_rule(api_type: str, model_size: Optional[str]) -> Optional[Tuple[int, float, Optional[float], Optional[float]]]:
+    """
+    查找定价规则，没有特定模型大小的规则时使用该API类型的默认规则
+    
+    Returns:
+        (规则ID, 基础价格, 每分钟价格, 每MB价格)，未找到规则时返回None
+    """
+    index = _get_rule_index()
+    if model_size:
+        rule = index.get((api_type, model_size))
+        if rule is not None:
+            return rule
+    return index.get((api_type, None))
+
+def invalidate_pricing_cache() -> None:
+    """清空定价规则缓存"""
+    global _rule_index_cache, _rule_index_generation
+    _rule_index_generation += 1
+    _rule_index_cache = None
+
+# 会话中有未提交的定价规则修改时，在session.info中记录该标记
+_PRICING_RULES_CHANGED = 'pricing_rules_changed'
+
+def _mark_pricing_rules_changed(session: Session) -> None:
+    """标记会话修改了定价规则，事务提交后清空缓存"""
+    session.info[_PRICING_RULES_CHANGED] = True
+
+@event.listens_for(Session, 'after_flush')
+def _on_session_flushed(session, flush_context):
+    """flush时检查是否写入了定价规则（此时new/dirty/deleted仍是flush前的状态）"""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, PricingRule):
+            _mark_pricing_rules_changed(session)
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _on_session_committed(session):
+    """定价规则的修改提交后才清空本进程的缓存，避免其他线程在提交前重新加载到旧规则"""
+    if session.info.pop(_PRICING_RULES_CHANGED, False):
+        invalidate_pricing_cache()
+
+@event.listens_for(Session, 'after_rollback')
+def _on_session_rolled_back(session):
+    """事务回滚后修改未生效，不需要清空缓存"""
+    session.info.pop(_PRICING_RULES_CHANGED, None)
+
+@lru_cache(maxsize=4096)
+def _estimate_fees(file_size_mb: float, audio_duration_minutes: float) -> Tuple[float, float, float, float, float]:
+    """
+    按默认定价规则计算费用，相同的文件大小和时长直接返回缓存结果
+    
+    Returns:
+        (总费用, 基础费用, 时长费用, 文件大小费用, 折扣率)，均已保留4位小数
+    """
+    base_fee, fee_per_minute, fee_per_mb, discount_rate = PricingService._COEFFICIENTS
+    
+    # 规则系数都是较小的十进制常数，使用浮点运算，只在返回时保留4位小数
+    duration_fee = fee_per_minute * audio_duration_minutes
+    file_size_fee = fee_per_mb * file_size_mb
+    total_cost = (base_fee + duration_fee + file_size_fee) * discount_rate
+    
+    return (
+        round(total_cost, 4),
+        round(float(base_fee), 4),
+        round(float(duration_fee), 4),
+        round(float(file_size_fee), 4),
+        float(discount_rate)
+    )
+
 class PricingService:
     """定价服务，负责计算API使用费用"""
     
@@ -23,85 +159,121 @@ class PricingService:
         'discount_rate': 1,   # 折扣率，默认100%
     }
     
+    # 支持的模型大小
+    MODEL_SIZES = ('tiny', 'base', 'small', 'medium', 'large')
+    
+    # 预先合并费用与权重：(基础费用, 每分钟费用, 每MB费用, 折扣率)
+    _COEFFICIENTS = (
+        DEFAULT_PRICING_RULES['base_fee'] * DEFAULT_PRICING_RULES['base_fee_weight'],
+        DEFAULT_PRICING_RULES['duration_fee'] * DEFAULT_PRICING_RULES['duration_fee_weight'],
+        DEFAULT_PRICING_RULES['file_size_fee'] * DEFAULT_PRICING_RULES['file_size_fee_weight'],
+        DEFAULT_PRICING_RULES['discount_rate'],
+    )
+    
+    # 充值套餐，类加载时构建一次
+    _CHARGE_PACKAGES = (
+        {
+            "id": "package_1",
+            "name": "基础套餐",
+            "points": 1000,
+            "price": 10,
+            "description": "1000点数 = 10元"
+        },
+        {
+            "id": "package_2",
+            "name": "进阶套餐",
+            "points": 5000,
+            "price": 45,
+            "description": "5000点数 = 45元"
+        },
+        {
+            "id": "package_3",
+            "name": "专业套餐",
+            "points": 10000,
+            "price": 80,
+            "description": "10000点数 = 80元"
+        },
+    )
+    
     @staticmethod
-    def estimate_cost(file_size_mb: float, audio_duration_minutes: Optional[float] = None) -> Dict[str, Any]:
+    def estimate_cost(
+        file_size_mb: float, 
+        audio_duration_minutes: Optional[float] = None, 
+        model_size: Optional[str] = None
+    ) -> Dict[str, Any]:
         """估算处理费用
         
         Args:
             file_size_mb: 文件大小（MB）=
             audio_duration_minutes: 音频时长（分钟），如果未提供，将根据文件大小估算
+            model_size: 模型大小，当前各模型使用相同的定价规则，仅记录在返回的详细信息中
             
         Returns:
             Dict: 包含预估费用和详细信息的字典
         """
         try:
-            # 获取定价规则
-            rule = PricingService.DEFAULT_PRICING_RULES
+            file_size_mb = float(file_size_mb)
             
             # 如果未提供音频时长，根据文件大小进行估算
             # 假设平均每分钟音频约2MB (根据实际情况调整)
             if audio_duration_minutes is None:
                 audio_duration_minutes = file_size_mb / 2.0
+            else:
+                audio_duration_minutes = float(audio_duration_minutes)
             
-            # 计算费用
-            # 1. 基础费用
-            base_fee = Decimal(str(rule['base_fee'])) * Decimal(str(rule['base_fee_weight']))
-            
-            # 2. 音频时长费用
-            duration_fee = Decimal(str(rule['duration_fee'])) * Decimal(str(rule['duration_fee_weight'])) * Decimal(str(audio_duration_minutes))
-            
-            # 3. 文件大小费用
-            file_size_fee = Decimal(str(rule['file_size_fee'])) * Decimal(str(rule['file_size_fee_weight'])) * Decimal(str(file_size_mb))
-            
-            # 总费用
-            total_cost = (base_fee + duration_fee + file_size_fee) * Decimal(str(rule['discount_rate']))
+            # 缓存中保存的是不可变元组，每次调用返回新的字典，调用方修改结果不会影响缓存
+            total_cost, base_fee, duration_fee, file_size_fee, discount_rate = _estimate_fees(
+                file_size_mb, audio_duration_minutes
+            )
             
             return {
-                "estimated_cost": float(total_cost),
+                "estimated_cost": total_cost,
                 "details": {
-                    "base_fee": float(base_fee),
-                    "duration_fee": float(duration_fee),
-                    "file_size_fee": float(file_size_fee),
-                    "file_size_mb": float(file_size_mb),
-                    "discount_rate": float(rule['discount_rate']),
-                    "audio_duration_minutes": float(audio_duration_minutes)
+                    "base_fee": base_fee,
+                    "duration_fee": duration_fee,
+                    "file_size_fee": file_size_fee,
+                    "file_size_mb": file_size_mb,
+                    "discount_rate": discount_rate,
+                    "audio_duration_minutes": audio_duration_minutes,
+                    "model_size": model_size
                 }
             }
         except Exception as e:
-            logger.error(f"估算费用失败: {str(e)}")
+            logger.error("估算费用失败: %s", e)
             raise
     
     @staticmethod
-    def get_pricing_rules() -> List[Dict[str, Any]]:
+    def get_all_model_pricing(file_size_mb: float, audio_duration_minutes: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """估算所有模型的处理费用
+        
+        Returns:
+            Dict: 模型大小到预估费用信息的映射
+        """
+        # 各模型使用相同的定价规则，只计算一次，再为每个模型复制结果并填入模型大小
+        cost_info = PricingService.estimate_cost(
+            file_size_mb=file_size_mb,
+            audio_duration_minutes=audio_duration_minutes
+        )
+        estimated_cost = cost_info["estimated_cost"]
+        details = cost_info["details"]
+        return {
+            model_size: {
+                "estimated_cost": estimated_cost,
+                "details": {**details, "model_size": model_size}
+            }
+            for model_size in PricingService.MODEL_SIZES
+        }
+    
+    @staticmethod
+    def get_pricing_rules() -> Dict[str, Any]:
         """获取所有定价规则"""
         return PricingService.DEFAULT_PRICING_RULES
     
     @staticmethod
     def get_charge_packages() -> List[Dict[str, Any]]:
         """获取充值套餐"""
-        return [
-            {
-                "id": "package_1",
-                "name": "基础套餐",
-                "points": 1000,
-                "price": 10,
-                "description": "1000点数 = 10元"
-            },
-            {
-                "id": "package_2",
-                "name": "进阶套餐",
-                "points": 5000,
-                "price": 45,
-                "description": "5000点数 = 45元"
-            },
-            {
-                "id": "package_3",
-                "name": "专业套餐",
-                "points": 10000,
-                "price": 80,
-                "description": "10000点数 = 80元"
-            }
-        ]
+        # 套餐内容固定，返回预先构建好的套餐列表的浅拷贝，调用方不应修改其中的字典
+        return list(PricingService._CHARGE_PACKAGES)
     
     @staticmethod
     def get_price(
@@ -111,27 +283,15 @@ class PricingService:
         file_size: Optional[float] = None
     ) -> Dict[str, Any]:
         """计算API使用价格"""
-        db = db_session()
         try:
-            # 查询定价规则
-            query = db.query(PricingRule).filter(
-                PricingRule.api_type == api_type,
-                PricingRule.is_active == True
-            )
-            
-            if model_size:
-                rule = query.filter(PricingRule.model_size == model_size).first()
-                if not rule:
-                    # 如果没有找到特定模型大小的规则，则使用默认规则
-                    rule = query.filter(PricingRule.model_size == None).first()
-            else:
-                rule = query.filter(PricingRule.model_size == None).first()
-            
-            if not rule:
+            # 查询定价规则（带缓存）
+            rule = _load_rule(api_type, model_size)
+            if rule is None:
                 raise ValueError(f"未找到API类型为{api_type}的定价规则")
+            rule_id, base_price, price_per_minute, price_per_mb = rule
             
             # 计算价格
-            price = float(rule.base_price)
+            price = base_price
             details = {
                 "base_price": price,
                 "duration_cost": 0,
@@ -139,15 +299,15 @@ class PricingService:
             }
             
             # 按时长计费
-            if duration and rule.price_per_minute:
-                duration_cost = float(rule.price_per_minute) * (duration / 60)  # 分钟单位
+            if duration and price_per_minute:
+                duration_cost = price_per_minute * (duration / 60)  # 分钟单位
                 price += duration_cost
                 details["duration_cost"] = duration_cost
                 details["duration"] = duration
             
             # 按文件大小计费
-            if file_size and rule.price_per_mb:
-                file_size_cost = float(rule.price_per_mb) * file_size
+            if file_size and price_per_mb:
+                file_size_cost = price_per_mb * file_size
                 price += file_size_cost
                 details["file_size_cost"] = file_size_cost
                 details["file_size"] = file_size
@@ -156,85 +316,188 @@ class PricingService:
                 "price": round(price, 4),
                 "api_type": api_type,
                 "model_size": model_size,
-                "rule_id": rule.id,
+                "rule_id": rule_id,
                 "details": details
             }
         except SQLAlchemyError as e:
-            logger.error(f"计算价格失败: {e}")
+            logger.error("计算价格失败: %s", e)
             raise
-        finally:
-            db.close()
     
     @staticmethod
-    def create_pricing_rule(rule_data: Dict[str, Any]) -> Dict[str, Any]:
-        """创建定价规则"""
+    def _pricing_rule_values(rule_data: Dict[str, Any]) -> Dict[str, Any]:
+        """校验定价规则数据并转换为数据库列值"""
         required_fields = ["api_type", "base_price"]
         for field in required_fields:
             if field not in rule_data:
                 raise ValueError(f"缺少必要字段: {field}")
         
         # 确保价格为Decimal类型
+        price_per_minute = rule_data.get("price_per_minute")
+        price_per_mb = rule_data.get("price_per_mb")
         try:
-            base_price = Decimal(str(rule_data["base_price"]))
-            price_per_minute = Decimal(str(rule_data.get("price_per_minute", 0))) if rule_data.get("price_per_minute") is not None else None
-            price_per_mb = Decimal(str(rule_data.get("price_per_mb", 0))) if rule_data.get("price_per_mb") is not None else None
-        except (ValueError, TypeError):
+            base_price = to_decimal(rule_data["base_price"])
+            price_per_minute = to_decimal(price_per_minute) if price_per_minute is not None else None
+            price_per_mb = to_decimal(price_per_mb) if price_per_mb is not None else None
+        except (ValueError, TypeError, InvalidOperation):
             raise ValueError("价格格式不正确")
         
+        return {
+            "api_type": rule_data["api_type"],
+            "model_size": rule_data.get("model_size"),
+            "base_price": base_price,
+            "price_per_minute": price_per_minute,
+            "price_per_mb": price_per_mb,
+            "description": rule_data.get("description"),
+            "is_active": rule_data.get("is_active", True)
+        }
+    
+    @staticmethod
+    def _charge_package_values(package_data: Dict[str, Any]) -> Dict[str, Any]:
+        """校验充值套餐数据并转换为数据库列值"""
+        required_fields = ["name", "price", "value"]
+        for field in required_fields:
+            if field not in package_data:
+                raise ValueError(f"缺少必要字段: {field}")
+        
+        # 确保价格为Decimal类型
+        try:
+            price = to_decimal(package_data["price"])
+            value = to_decimal(package_data["value"])
+        except (ValueError, TypeError, InvalidOperation):
+            raise ValueError("价格格式不正确")
+        
+        return {
+            "name": package_data["name"],
+            "price": price,
+            "value": value,
+            "description": package_data.get("description"),
+            "is_active": package_data.get("is_active", True),
+            "sort_order": package_data.get("sort_order", 0)
+        }
+    
+    @staticmethod
+    def create_pricing_rule(rule_data: Dict[str, Any], session: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        创建定价规则
+        
+        Args:
+            rule_data: 定价规则数据
+            session: 调用方已持有的会话，传入时只flush不提交，由调用方统一提交事务
+        """
+        values = PricingService._pricing_rule_values(rule_data)
+        
+        if session is not None:
+            rule = PricingRule(**values)
+            session.add(rule)
+            session.flush()
+            return rule.to_dict()
+        
         db = db_session()
         try:
-            rule = PricingRule(
-                api_type=rule_data["api_type"],
-                model_size=rule_data.get("model_size"),
-                base_price=base_price,
-                price_per_minute=price_per_minute,
-                price_per_mb=price_per_mb,
-                description=rule_data.get("description"),
-                is_active=rule_data.get("is_active", True)
-            )
+            rule = PricingRule(**values)
             db.add(rule)
             db.commit()
             db.refresh(rule)
             return rule.to_dict()
         except SQLAlchemyError as e:
             db.rollback()
-            logger.error(f"创建定价规则失败: {e}")
+            logger.error("创建定价规则失败: %s", e)
             raise
         finally:
             db.close()
     
     @staticmethod
-    def create_charge_package(package_data: Dict[str, Any]) -> Dict[str, Any]:
-        """创建充值套餐"""
-        required_fields = ["name", "price", "value"]
-        for field in required_fields:
-            if field not in package_data:
-                raise ValueError(f"缺少必要字段: {field}")
+    def create_pricing_rules_bulk(rules_data: List[Dict[str, Any]], session: Optional[Session] = None) -> int:
+        """
+        批量创建定价规则（用于初始化数据），所有规则在一个事务中插入
         
-        # 确保价格为Decimal类型
-        try:
-            price = Decimal(str(package_data["price"]))
-            value = Decimal(str(package_data["value"]))
-        except (ValueError, TypeError):
-            raise ValueError("价格格式不正确")
+        Args:
+            session: 调用方已持有的会话，传入时不提交，由调用方统一提交事务
+        
+        Returns:
+            插入的规则数量
+        """
+        rows = [PricingService._pricing_rule_values(rule_data) for rule_data in rules_data]
+        if not rows:
+            return 0
+        
+        # 使用Core批量插入，由驱动合并为多行INSERT；Core插入不会经过flush，需要手动标记，提交后清空定价规则缓存
+        if session is not None:
+            session.execute(PricingRule.__table__.insert(), rows)
+            _mark_pricing_rules_changed(session)
+        else:
+            db = db_session()
+            try:
+                db.execute(PricingRule.__table__.insert(), rows)
+                _mark_pricing_rules_changed(db)
+                db.commit()
+            except SQLAlchemyError as e:
+                db.rollback()
+                logger.error("批量创建定价规则失败: %s", e)
+                raise
+            finally:
+                db.close()
+        
+        return len(rows)
+    
+    @staticmethod
+    def create_charge_package(package_data: Dict[str, Any], session: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        创建充值套餐
+        
+        Args:
+            package_data: 充值套餐数据
+            session: 调用方已持有的会话，传入时只flush不提交，由调用方统一提交事务
+        """
+        values = PricingService._charge_package_values(package_data)
+        
+        if session is not None:
+            package = ChargePackage(**values)
+            session.add(package)
+            session.flush()
+            return package.to_dict()
         
         db = db_session()
         try:
-            package = ChargePackage(
-                name=package_data["name"],
-                price=price,
-                value=value,
-                description=package_data.get("description"),
-                is_active=package_data.get("is_active", True),
-                sort_order=package_data.get("sort_order", 0)
-            )
+            package = ChargePackage(**values)
             db.add(package)
             db.commit()
             db.refresh(package)
             return package.to_dict()
         except SQLAlchemyError as e:
             db.rollback()
-            logger.error(f"创建充值套餐失败: {e}")
+            logger.error("创建充值套餐失败: %s", e)
             raise
         finally:
-            db.close() 
\ No newline at end of file
+            db.close()
+    
+    @staticmethod
+    def create_charge_packages_bulk(packages_data: List[Dict[str, Any]], session: Optional[Session] = None) -> int:
+        """
+        批量创建充值套餐（用于初始化数据），所有套餐在一个事务中插入
+        
+        Args:
+            session: 调用方已持有的会话，传入时不提交，由调用方统一提交事务
+        
+        Returns:
+            插入的套餐数量
+        """
+        rows = [PricingService._charge_package_values(package_data) for package_data in packages_data]
+        if not rows:
+            return 0
+        
+        if session is not None:
+            session.execute(ChargePackage.__table__.insert(), rows)
+        else:
+            db = db_session()
+            try:
+                db.execute(ChargePackage.__table__.insert(), rows)
+                db.commit()
+            except SQLAlchemyError as e:
+                db.rollback()
+                logger.error("批量创建充值套餐失败: %s", e)
+                raise
+            finally:
+                db.close()
+        
+        return len(rows)
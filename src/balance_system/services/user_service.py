@@ -1,5 +1,6 @@
 from typing import Optional
 import logging
+from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..db import db_session
@@ -8,7 +9,11 @@ from ..models.user import User
 logger = logging.getLogger(__name__)
 
 class UserService:
-    """用户服务，提供用户相关操作"""
+    """用户服务，提供用户相关操作
+    
+    db_session是按请求划分作用域的scoped_session，同一请求内的查询共用一个会话和连接，
+    请求结束时由shutdown_session归还连接池
+    """
     
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """根据ID获取用户
@@ -20,8 +25,10 @@ class UserService:
             User: 用户对象，不存在则返回None
         """
         try:
-            return db_session.query(User).filter(User.id == user_id).first()
+            # 按主键获取，本次请求的会话中已加载过该用户时直接从identity map返回，不再查询数据库
+            return db_session.get(User, user_id)
         except SQLAlchemyError as e:
+            db_session.rollback()
             logger.error(f"查询用户失败: {e}")
             return None
     
@@ -37,9 +44,26 @@ class UserService:
         try:
             return db_session.query(User).filter(User.email == email).first()
         except SQLAlchemyError as e:
+            db_session.rollback()
             logger.error(f"根据邮箱查询用户失败: {e}")
             return None
             
+    def get_user_id_by_email(self, email: str) -> Optional[str]:
+        """根据邮箱获取用户ID，只查询ID列，不构造User对象
+        
+        Args:
+            email: 用户邮箱
+            
+        Returns:
+            str: 用户ID，不存在则返回None
+        """
+        try:
+            return db_session.execute(select(User.id).where(User.email == email)).scalar()
+        except SQLAlchemyError as e:
+            db_session.rollback()
+            logger.error(f"根据邮箱查询用户ID失败: {e}")
+            return None
+            
     def get_user_by_username(self, username: str) -> Optional[User]:
         """根据用户名获取用户
         
@@ -52,5 +76,6 @@ class UserService:
         try:
             return db_session.query(User).filter(User.username == username).first()
         except SQLAlchemyError as e:
+            db_session.rollback()
             logger.error(f"根据用户名查询用户失败: {e}")
             return None 
\ No newline at end of file
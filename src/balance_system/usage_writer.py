@@ -0,0 +1,106 @@
+"""
+API使用记录的后台批量写入模块
+
+请求线程只把待写入的记录放入队列，由后台线程按批次写入数据库，避免每次请求都等待一次INSERT。
+"""
+import atexit
+import logging
+import queue
+import threading
+from typing import Dict, Any, List
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .db import Session
+from .models.api_usage import ApiUsage
+
+logger = logging.getLogger(__name__)
+
+# 队列最大长度，队列满时回退为同步写入
+QUEUE_MAX_SIZE = 10000
+# 每批最多写入的记录数
+BATCH_SIZE = 200
+# 等待凑满一批的最长时间（秒）
+FLUSH_INTERVAL = 0.5
+
+_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=QUEUE_MAX_SIZE)
+_worker = None
+_worker_lock = threading.Lock()
+_stop = threading.Event()
+
+def _write_batch(batch: List[Dict[str, Any]]) -> None:
+    """批量写入一批记录（一条多行INSERT）；批量写入失败时逐条重试，跳过写入失败的记录"""
+    session = Session()
+    try:
+        session.execute(ApiUsage.__table__.insert(), batch)
+        session.commit()
+        session.close()
+        return
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.warning(f"批量写入API使用记录失败，改为逐条写入: {e}")
+    
+    try:
+        for mapping in batch:
+            try:
+                session.execute(ApiUsage.__table__.insert(), [mapping])
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.error(f"写入API使用记录失败: {mapping}, 错误: {e}")
+    finally:
+        session.close()
+
+def _drain(block: bool) -> List[Dict[str, Any]]:
+    """从队列中取出最多BATCH_SIZE条记录，block为True时等待第一条记录最多FLUSH_INTERVAL秒"""
+    batch = []
+    try:
+        batch.append(_queue.get(block=block, timeout=FLUSH_INTERVAL if block else None))
+        while len(batch) < BATCH_SIZE:
+            batch.append(_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+def _run() -> None:
+    """后台线程主循环"""
+    while not _stop.is_set():
+        batch = _drain(block=True)
+        if batch:
+            _write_batch(batch)
+
+def _ensure_worker() -> None:
+    """首次使用时启动后台写入线程"""
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="api-usage-writer", daemon=True)
+            _worker.start()
+            atexit.register(flush)
+
+def enqueue(mapping: Dict[str, Any]) -> None:
+    """
+    提交一条API使用记录，由后台线程批量写入
+    
+    Args:
+        mapping: ApiUsage的列值字典
+    """
+    _ensure_worker()
+    try:
+        _queue.put_nowait(mapping)
+    except queue.Full:
+        logger.warning("API使用记录队列已满，同步写入")
+        _write_batch([mapping])
+
+def flush() -> None:
+    """停止后台线程并写入队列中剩余的所有记录（进程退出时调用）"""
+    _stop.set()
+    if _worker is not None:
+        _worker.join(timeout=FLUSH_INTERVAL * 2)
+    while True:
+        batch = _drain(block=False)
+        if not batch:
+            break
+        _write_batch(batch)
@@ -6,7 +6,7 @@ import uuid
 import shutil
 import tempfile
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 
 
 class TempFileManager:
@@ -40,8 +40,11 @@ class TempFileManager:
         # 跟踪创建的所有临时文件
         self.temp_files: List[str] = []
         
-        # 添加保护文件列表，这些文件不会被cleanup方法清理
-        self.protected_files: List[str] = []
+        # 添加保护文件集合，这些文件不会被cleanup方法清理
+        self.protected_files: Set[str] = set()
+        
+        # 以硬链接方式创建的文件，与源文件共享数据，只能读取，不能写入或截断
+        self.linked_files: Set[str] = set()
     
     def create_temp_file(self, suffix: str = "", prefix: Optional[str] = None) -> str:
         """
@@ -82,16 +85,60 @@ class TempFileManager:
         safe_name = name.replace(os.path.sep, "_")  # 确保文件名没有路径分隔符
         temp_path = os.path.join(self.session_dir, f"{safe_name}{suffix}")
         
+        # 同名文件是硬链接时先删除链接，避免以写方式打开时截断源文件
+        if temp_path in self.linked_files:
+            os.unlink(temp_path)
+            self.linked_files.discard(temp_path)
+        
         # 创建空文件
         with open(temp_path, 'w') as f:
             pass
         
         # 添加到跟踪列表
-        self.temp_files.append(temp_path)
+        if temp_path not in self.temp_files:
+            self.temp_files.append(temp_path)
         
         self.logger.debug(f"创建命名临时文件: {temp_path}")
         return temp_path
     
+    def create_named_link(self, src_path: str, name: str, suffix: str = "") -> Optional[str]:
+        """
+        以硬链接方式创建命名临时文件，不复制任何数据
+        
+        链接与源文件共享数据，只能作为只读文件使用；删除链接不影响源文件。
+        
+        Args:
+            src_path: 源文件路径
+            name: 文件名
+            suffix: 文件后缀
+            
+        Returns:
+            链接的路径，无法创建硬链接（如跨文件系统）时返回None
+        """
+        safe_name = name.replace(os.path.sep, "_")  # 确保文件名没有路径分隔符
+        temp_path = os.path.join(self.session_dir, f"{safe_name}{suffix}")
+        
+        # 先链接到临时名称再替换，目标已存在时只替换目录项，不会写入原有文件
+        link_path = f"{temp_path}.link"
+        try:
+            os.link(src_path, link_path)
+            os.replace(link_path, temp_path)
+            # 目标已经是同一文件的硬链接时rename不做任何操作，需要手动删除临时链接
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+        except OSError as e:
+            self.logger.debug(f"无法创建硬链接: {src_path} -> {temp_path}, 错误: {str(e)}")
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+            return None
+        
+        if temp_path not in self.temp_files:
+            self.temp_files.append(temp_path)
+        self.linked_files.add(temp_path)
+        
+        self.logger.debug(f"创建硬链接: {src_path} -> {temp_path}")
+        return temp_path
+    
     def create_temp_dir(self, suffix: str = "", prefix: Optional[str] = None) -> str:
         """
         创建临时目录
@@ -129,7 +176,7 @@ class TempFileManager:
             return False
             
         if file_path not in self.protected_files:
-            self.protected_files.append(file_path)
+            self.protected_files.add(file_path)
             self.logger.debug(f"添加文件到保护列表: {file_path}")
             return True
         return False
@@ -145,7 +192,7 @@ class TempFileManager:
             移除是否成功
         """
         if file_path in self.protected_files:
-            self.protected_files.remove(file_path)
+            self.protected_files.discard(file_path)
             self.logger.debug(f"从保护列表中移除文件: {file_path}")
             return True
         return False
@@ -173,6 +220,7 @@ class TempFileManager:
                     os.remove(file_path)
                     
                 self.temp_files.remove(file_path)
+                self.linked_files.discard(file_path)
                 self.logger.debug(f"删除临时文件: {file_path}")
                 return True
             except Exception as e:
@@ -186,22 +234,44 @@ class TempFileManager:
         """清理所有临时文件，但保留受保护的文件"""
         self.logger.debug(f"清理临时文件会话: {self.session_dir}, 跳过 {len(self.protected_files)} 个受保护文件")
         
-        # 清理所有临时文件，除了受保护的文件
-        files_to_clean = [f for f in self.temp_files if f not in self.protected_files]
+        # 一次遍历清理所有临时文件，除了受保护的文件；删除失败的文件保留在跟踪列表中，错误汇总后记录
+        remaining = []
+        failed = []
+        for file_path in self.temp_files:
+            if file_path in self.protected_files:
+                remaining.append(file_path)
+                continue
+            try:
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass
+                except (IsADirectoryError, PermissionError):
+                    if not os.path.isdir(file_path):
+                        raise
+                    shutil.rmtree(file_path)
+            except Exception as e:
+                remaining.append(file_path)
+                failed.append(f"{file_path}: {str(e)}")
+        self.temp_files = remaining
+        self.linked_files.intersection_update(remaining)
         
-        for file_path in files_to_clean:
-            self.remove_file(file_path)
+        if failed:
+            self.logger.error(f"删除 {len(failed)} 个临时文件失败: {'; '.join(failed)}")
         
         # 如果会话目录中已经没有文件，尝试删除会话目录
-        if not self.protected_files and os.path.exists(self.session_dir):
+        if not self.protected_files:
             try:
                 # 检查目录是否为空
-                remaining_files = os.listdir(self.session_dir)
-                if not remaining_files:
-                    shutil.rmtree(self.session_dir)
+                with os.scandir(self.session_dir) as entries:
+                    is_empty = next(entries, None) is None
+                if is_empty:
+                    os.rmdir(self.session_dir)
                     self.logger.debug(f"删除临时会话目录: {self.session_dir}")
                 else:
-                    self.logger.debug(f"会话目录非空，跳过删除: {self.session_dir}, 剩余 {len(remaining_files)} 个文件")
+                    self.logger.debug(f"会话目录非空，跳过删除: {self.session_dir}")
+            except FileNotFoundError:
+                pass
             except Exception as e:
                 self.logger.error(f"删除临时会话目录失败: {self.session_dir}, 错误: {str(e)}")
     
@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import logging.handlers
+import atexit
+import queue
 import os
 import sys
 import threading
@@ -76,6 +79,19 @@ class ContextFilter(logging.Filter):
 class LoggingConfig:
     """日志系统配置类，统一管理应用中的日志配置"""
     
+    # 后台日志监听线程，负责格式化并写入控制台/文件
+    _queue_listener = None
+    _atexit_registered = False
+    
+    @staticmethod
+    def _stop_queue_listener() -> None:
+        """停止当前的后台日志监听线程，并刷新队列中剩余的日志"""
+        if LoggingConfig._queue_listener is not None:
+            LoggingConfig._queue_listener.stop()
+            for handler in LoggingConfig._queue_listener.handlers:
+                handler.close()
+            LoggingConfig._queue_listener = None
+    
     @staticmethod
     def setup_logging(log_level=logging.DEBUG, log_to_file=True, app_name="audio_app"):
         """
@@ -111,6 +127,7 @@ class LoggingConfig:
         # 清除已有的处理器，避免重复
         for handler in logger.handlers[:]:
             logger.removeHandler(handler)
+        LoggingConfig._stop_queue_listener()
         
         # 创建上下文过滤器
         context_filter = ContextFilter()
@@ -129,27 +146,40 @@ class LoggingConfig:
         
         # 控制台处理器
         console = logging.StreamHandler(sys.stdout)
-        console.addFilter(context_filter)
         if log_level <= logging.DEBUG:
             console.setFormatter(debug_formatter)
         else:
             console.setFormatter(formatter)
-        logger.addHandler(console)
+        handlers = [console]
         
         # 文件处理器(可选)
         if log_to_file:
             file_handler = logging.FileHandler(log_file, encoding='utf-8')
-            file_handler.addFilter(context_filter)
             file_handler.setFormatter(debug_formatter)  # 文件中始终使用详细格式
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
             
             # 添加一个错误日志文件处理器
             error_log_file = os.path.join(log_dir, f"{app_name}_errors_{datetime.now().strftime('%Y%m%d')}.log")
             error_handler = logging.FileHandler(error_log_file, encoding='utf-8')
-            error_handler.addFilter(context_filter)
             error_handler.setLevel(logging.ERROR)
             error_handler.setFormatter(debug_formatter)
-            logger.addHandler(error_handler)
+            handlers.append(error_handler)
+        
+        # 工作线程只把日志记录放入队列，格式化和写入由后台监听线程完成，
+        # 避免多线程处理音频时在stdout/文件锁上互相等待。
+        # 上下文过滤器必须挂在队列处理器上，在产生日志的线程中读取线程本地上下文。
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(context_filter)
+        logger.addHandler(queue_handler)
+        
+        if not LoggingConfig._atexit_registered:
+            atexit.register(LoggingConfig._stop_queue_listener)
+            LoggingConfig._atexit_registered = True
+        LoggingConfig._queue_listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        LoggingConfig._queue_listener.start()
         
         logger.info(f"日志系统初始化完成，日志文件: {log_file}")
         return logger